@@ -4,8 +4,8 @@ import base64
 import logging
 import requests
 import datetime
+from functools import lru_cache
 from io import BytesIO
-import pandas as pd
 from openai import OpenAI
 from urllib.parse import urlparse
 import trafilatura
@@ -487,7 +487,7 @@ class AIService:
             product_data (dict): The processed product data
             
         Returns:
-            dict: CSV-ready data structure
+            dict: CSV-ready data structure, with the rows under "csv_data" as a list of dicts
         """
         try:
             # Extract base product data
@@ -580,7 +580,7 @@ class AIService:
                         image_row["Image Alt Text"] = f"{csv_data['Title']} - Image {i+1}"
                         formatted_data.append(image_row)
             
-            # Create a DataFrame for CSV export and handle empty data
+            # Handle empty data
             if not formatted_data:
                 formatted_data = [{
                     "Handle": "",
@@ -601,11 +601,10 @@ class AIService:
                     "Variant Price": "",
                     "Image Src": "",
                 }]
-            df = pd.DataFrame(formatted_data)
             
-            # Return in a format compatible with the existing system
+            # Keep the rows as plain dicts; callers build a DataFrame only when they need one
             return {
-                "csv_data": df, 
+                "csv_data": formatted_data, 
                 "product_count": 1,
                 "variant_count": len(variants),
                 "image_count": len(image_urls) if "image_urls" in product_data else 0
@@ -1390,4 +1389,22 @@ class AIService:
             
         except Exception as e:
             logger.error(f"Failed to generate image captions: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+
+@lru_cache(maxsize=8)
+def get_ai_service(api_key, api_provider):
+    """
+    Get a shared AI service for a set of credentials.
+    
+    Reusing the service keeps its API client's HTTP connections open between
+    requests instead of creating a new client each time.
+    
+    Args:
+        api_key (str): The API key for the AI provider
+        api_provider (str): The AI provider to use ('openai' or 'x.ai')
+        
+    Returns:
+        AIService: The service for these credentials
+    """
+    return AIService(api_key=api_key, api_provider=api_provider)
@@ -1,21 +1,39 @@
 import os
+import re
+import csv
+import io
 import logging
 import time
 import json
 import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, Response, jsonify
-from werkzeug.utils import secure_filename
+from types import SimpleNamespace
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, Response, jsonify, stream_template, stream_with_context, abort, current_app
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import load_only, raiseload, selectinload
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # python-calamine is optional; fall back to openpyxl
+    CalamineWorkbook = None
 from forms import UploadForm, ShopifySettingsForm, AISettingsForm, AIGeneratorForm, BlogPostGeneratorForm, PageGeneratorForm, ImageCaptionGeneratorForm
-from data_processor import process_data, validate_data
-from shopify_client import ShopifyClient
-from ai_service import AIService
+from data_processor import process_data, validate_data, is_product_column, PRODUCT_COLUMN_DTYPES
+from shopify_client import ShopifyClient, get_shopify_client
+from ai_service import get_ai_service
 from web_scraper import ProductScraper
 from models import db, ShopifySettings, AISettings, UploadHistory, ProductUploadResult, BlogPost, PageContent, ImageBatch, ImageItem
 from models import TrendAnalysis, ProductSource, ProductEvaluation, NicheAnalysis, AgentTask
 from models import StoreSetup, StorePage, StoreProduct, ThemeCustomization
 from agents import DropshippingAgent, StoreAgent
+from ttl_cache import TTLCache
+import result_store
+import tasks
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -25,18 +43,457 @@ logger = logging.getLogger(__name__)
 app = Blueprint('main', __name__)
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = frozenset({'csv', 'xlsx', 'xls'})
 
 # Temporary storage for uploaded files
 UPLOAD_FOLDER = '/tmp'
 
+# Number of CSV rows parsed and processed at a time
+CSV_CHUNK_SIZE = 1000
+
+# Maximum number of products created in Shopify in parallel per upload
+SHOPIFY_UPLOAD_CONCURRENCY = 8
+
+# Maximum number of images captioned by the AI provider in parallel per batch
+IMAGE_CAPTION_CONCURRENCY = 8
+
+# Number of captioned images saved per commit, so batch progress stays visible
+IMAGE_BATCH_COMMIT_SIZE = 20
+
+# Bytes copied at a time when saving an uploaded image to disk
+UPLOAD_COPY_BUFFER_SIZE = 1 << 20
+
+# Folder holding each upload's validated rows between upload() and the background
+# upload task; files are named after the upload ID, never taken from the session
+FRAME_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'upload_frames')
+
+# ImageItem columns written to an image caption batch's CSV export, in order
+IMAGE_CAPTION_EXPORT_COLUMNS = (
+    'filename', 'url', 'alt_text', 'caption', 'tags', 'detailed_description', 'seo_keywords',
+    'seo_title', 'product_suggested_name', 'product_category', 'status', 'shopify_product_id',
+    'shopify_image_id', 'shopify_updated',
+)
+
+# Rows fetched from the database cursor at a time when streaming a CSV export
+EXPORT_FETCH_SIZE = 500
+
+# SEO columns copied from the uploaded rows onto each ProductUploadResult
+SEO_COLUMNS = ('meta_title', 'meta_description', 'meta_keywords', 'url_handle', 'category_hierarchy')
+
+# Runs of characters that are not allowed in filenames and URL handles
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+# Runs of characters that are not kept in the names of saved uploads
+_UNSAFE_FILENAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
+# Seconds a snapshot of the active Shopify/AI settings is reused before re-querying
+SETTINGS_CACHE_TTL = 30
+
+# Seconds the blog sidebar post counts are reused before re-querying
+BLOG_STATS_CACHE_TTL = 60
+
+# Seconds the store list and agent task statuses polled by the agent UI are reused
+STORES_CACHE_TTL = 10
+AGENT_TASK_STATUS_CACHE_TTL = 2
+
+_settings_cache = TTLCache(SETTINGS_CACHE_TTL)
+_blog_stats_cache = TTLCache(BLOG_STATS_CACHE_TTL)
+_stores_cache = TTLCache(STORES_CACHE_TTL)
+_agent_task_status_cache = TTLCache(AGENT_TASK_STATUS_CACHE_TTL)
+_NOT_CACHED = object()
+
+def _get_active_settings(model):
+    """
+    Get a detached snapshot of the active settings row for a settings model.
+    
+    The snapshot is a plain namespace holding the row's column values, so it
+    can be shared across requests without being bound to a database session.
+    Routes that modify settings must query the model directly instead.
+    """
+    snapshot = _settings_cache.get(model.__name__, _NOT_CACHED)
+    if snapshot is _NOT_CACHED:
+        snapshot = _cache_settings_snapshot(model, model.query.filter_by(is_active=True).first())
+    return snapshot
+
+def _cache_settings_snapshot(model, row):
+    """Cache and return a snapshot of a settings row (None if there is no active row)"""
+    snapshot = None
+    if row:
+        snapshot = SimpleNamespace(**{column.name: getattr(row, column.name)
+                                      for column in model.__table__.columns})
+    _settings_cache.set(model.__name__, snapshot)
+    return snapshot
+
+def get_active_shopify_settings():
+    """Get the active Shopify settings (cached snapshot), or None"""
+    return _get_active_settings(ShopifySettings)
+
+def get_active_ai_settings():
+    """Get the active AI settings (cached snapshot), or None"""
+    return _get_active_settings(AISettings)
+
+def get_or_404_with_shopify_settings(model, object_id):
+    """
+    Get a record by ID together with the active Shopify settings.
+    
+    When the settings snapshot isn't cached, both rows are loaded with one
+    outer-joined query instead of two round trips.
+    
+    Args:
+        model: Model class of the record
+        object_id (int): Primary key of the record
+        
+    Returns:
+        tuple: The record and the active Shopify settings snapshot (or None)
+    """
+    snapshot = _settings_cache.get(ShopifySettings.__name__, _NOT_CACHED)
+    if snapshot is not _NOT_CACHED:
+        return db.get_or_404(model, object_id), snapshot
+    
+    row = (db.session.query(model, ShopifySettings)
+           .outerjoin(ShopifySettings, ShopifySettings.is_active.is_(True))
+           .filter(model.id == object_id)
+           .first())
+    if row is None:
+        abort(404)
+    record, active_settings = row
+    return record, _cache_settings_snapshot(ShopifySettings, active_settings)
+
+def invalidate_settings_cache():
+    """Drop cached settings snapshots after settings have been changed"""
+    _settings_cache.clear()
+
+def get_blog_post_stats():
+    """
+    Get the blog post counts shown in the blog generator sidebar.
+    
+    All three counts come from one conditionally aggregated row and are
+    cached for BLOG_STATS_CACHE_TTL seconds, since they don't need to be exact.
+    """
+    stats = _blog_stats_cache.get('stats')
+    if stats is None:
+        total, published, draft = db.session.execute(select(
+            func.count(),
+            func.count(case((BlogPost.status == 'published', 1))),
+            func.count(case((BlogPost.status == 'draft', 1)))
+        ).select_from(BlogPost)).one()
+        stats = {
+            'total_posts': total,
+            'published_posts': published,
+            'draft_posts': draft
+        }
+        _blog_stats_cache.set('stats', stats)
+    return stats
+
+def invalidate_blog_stats_cache():
+    """Drop the cached blog post counts after a post is added or changes status"""
+    _blog_stats_cache.clear()
+
+# Statuses a blog post or page holds while a background task works on it, with
+# the status, error column and message recorded when that task was abandoned
+STALLED_TASK_STATUSES = {
+    'generating': ('generation_failed', 'generation_error',
+                   'Generation was interrupted before it finished. Please generate the content again.'),
+    'publishing': ('publish_failed', 'publish_error',
+                   'Publishing was interrupted before it finished. Please publish again.'),
+}
+
+def expire_stalled_task(record):
+    """
+    Mark a blog post or page as failed when the background task working on it
+    stopped without finishing, e.g. because its worker process restarted.
+    
+    Only records that have gone without updates for tasks.STALE_TASK_TIMEOUT
+    are changed, and only if no one else updated them in the meantime.
+    
+    Args:
+        record: BlogPost or PageContent
+        
+    Returns:
+        bool: True if the record was marked as failed
+    """
+    stalled = STALLED_TASK_STATUSES.get(record.status)
+    if not stalled or not tasks.is_stale(record.updated_at):
+        return False
+    
+    failed_status, error_column, message = stalled
+    model = type(record)
+    result = db.session.execute(update(model).where(
+        model.id == record.id,
+        model.status == record.status,
+        model.updated_at == record.updated_at
+    ).values({'status': failed_status, error_column: message}))
+    db.session.commit()
+    if result.rowcount != 1:
+        return False
+    
+    logger.warning(f"Marked stalled {model.__name__} {record.id} as {failed_status}")
+    invalidate_blog_stats_cache()
+    return True
+
+def wants_json_response():
+    """Return True if the client asked for JSON (API/AJAX) instead of a redirect"""
+    return request.args.get('async') == '1' or request.accept_mimetypes.best == 'application/json'
+
+def publish_reply(status, message, category, redirect_url, status_url=None, status_code=202):
+    """
+    Answer a publish request with JSON for API/AJAX clients, or flash and redirect for browsers.
+    
+    Args:
+        status (str): Machine-readable outcome, e.g. 'queued'
+        message (str): Message shown to the user
+        category (str): Flash message category
+        redirect_url (str): Where browsers are sent
+        status_url (str, optional): Endpoint JSON clients can poll
+        status_code (int): HTTP status of the JSON response
+    """
+    if wants_json_response():
+        return jsonify({'status': status, 'message': message, 'status_url': status_url}), status_code
+    flash(message, category)
+    return redirect(redirect_url)
+
+def file_extension(filename):
+    """Return the lowercased extension of a filename, or '' if it has none"""
+    _, dot, extension = filename.rpartition('.')
+    return extension.lower() if dot else ''
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return file_extension(filename) in ALLOWED_EXTENSIONS
+
+def slugify(text, max_length=30, separator='_'):
+    """Lowercase text and collapse anything but letters and digits into separator"""
+    return _SLUG_RE.sub(separator, text.lower()).strip(separator)[:max_length]
+
+@lru_cache(maxsize=1024)
+def safe_filename(filename):
+    """Make an uploaded filename safe to save: no directories, spaces or leading dots"""
+    basename = filename.replace('\\', '/').rsplit('/', 1)[-1]
+    return _UNSAFE_FILENAME_RE.sub('_', basename).strip('._')[:255] or 'upload'
+
+def row_columns(rows):
+    """Return the union of the keys of a list of row dicts, in first-seen order"""
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+def build_csv_preview(rows, limit=5):
+    """Return the columns and the first limit rows of a list of row dicts as lists"""
+    columns = row_columns(rows)
+    return {'columns': columns,
+            'rows': [[row.get(column, '') for column in columns] for row in rows[:limit]]}
+
+def write_rows_csv(rows, file_path):
+    """Write a list of row dicts to a CSV file, leaving missing keys blank"""
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=row_columns(rows), restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def save_upload(file, file_path):
+    """
+    Save an uploaded file in large chunks and return its size.
+    
+    Args:
+        file (FileStorage): Uploaded file
+        file_path (str): Destination path
+        
+    Returns:
+        int: Number of bytes written
+    """
+    size = 0
+    with open(file_path, 'wb') as out:
+        while chunk := file.stream.read(UPLOAD_COPY_BUFFER_SIZE):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+def iter_product_frames(file_path, file_type):
+    """
+    Yield the rows of an uploaded product file as DataFrame chunks.
+
+    file_path may also be a file-like object such as an upload stream.
+
+    CSV and Excel files are both turned into DataFrames CSV_CHUNK_SIZE rows
+    at a time so memory use stays flat regardless of file size. Legacy .xls
+    workbooks need python-calamine for that; without it they are read in a
+    single frame. Chunk indexes continue across chunks, so row numbers stay
+    file-relative. Only the columns used for uploading products are parsed.
+    """
+    if file_type == 'csv':
+        yield from pd.read_csv(file_path, chunksize=CSV_CHUNK_SIZE, engine='c',
+                               usecols=is_product_column, dtype=PRODUCT_COLUMN_DTYPES)
+    elif file_type == 'xls' and CalamineWorkbook is None:
+        yield pd.read_excel(file_path, usecols=is_product_column, dtype=PRODUCT_COLUMN_DTYPES)
+    else:  # Excel workbook
+        yield from iter_excel_frames(file_path)
+
+def frame_cache_path(upload_id):
+    """Return the path of the validated rows cached by upload() for an upload"""
+    return os.path.join(FRAME_CACHE_FOLDER, f'upload_{upload_id}.csv')
+
+def discard_frame_cache(upload_id):
+    """Delete the cached rows of an upload that will not be processed"""
+    try:
+        os.remove(frame_cache_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+def read_csv_file(file_path):
+    """
+    Read a whole CSV file into a DataFrame.
+    
+    Uses pandas' multithreaded pyarrow engine and falls back to the C engine
+    when pyarrow is not installed. Chunked reads stay on the C engine, which
+    is the only one that supports chunksize. Text columns get the same string
+    dtypes as chunked reads so neither engine has to infer them, but results
+    stay NumPy-backed because process_data() expects NaN for missing cells.
+    """
+    try:
+        return pd.read_csv(file_path, engine='pyarrow', dtype=PRODUCT_COLUMN_DTYPES)
+    except ImportError:
+        return pd.read_csv(file_path, dtype=PRODUCT_COLUMN_DTYPES)
+
+def _calamine_cell(value):
+    """Convert a python-calamine cell like pandas does: '' to None, whole floats to int"""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def iter_excel_rows(file_path):
+    """
+    Yield the rows of the first worksheet of an Excel workbook as sequences.
+    
+    Uses the Rust-based python-calamine reader when it is installed, which
+    parses 5-20x faster than openpyxl and also reads .xls files. Otherwise
+    the workbook is opened in openpyxl's read-only mode, which streams rows
+    from the file instead of loading the whole sheet. Empty cells are None.
+    
+    Rows with every cell empty are skipped with either reader, as
+    pandas.read_excel() skips them. That includes blank rows before the
+    header and formatted but empty rows, which both readers return as part of
+    the sheet's used range.
+    """
+    if CalamineWorkbook is not None:
+        sheet = CalamineWorkbook.from_object(file_path).get_sheet_by_index(0)
+        for row in sheet.iter_rows():
+            values = [_calamine_cell(value) for value in row]
+            if any(value is not None for value in values):
+                yield values
+        return
+    
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            if any(value is not None for value in row):
+                yield row
+    finally:
+        workbook.close()
+
+def iter_excel_frames(file_path):
+    """
+    Yield the first worksheet of an Excel workbook as DataFrame chunks.
+    
+    CSV_CHUNK_SIZE rows from iter_excel_rows() are turned into a DataFrame at
+    a time. Columns are filtered and typed the same way as the chunked CSV
+    reader. Rows with none of those columns filled in are skipped too, and a
+    sheet with only a header row yields one empty chunk so its columns are
+    still validated.
+    """
+    rows = iter_excel_rows(file_path)
+    header = next(rows, None)
+    if header is None:
+        return
+    
+    columns = [(i, name) for i, name in enumerate(header) if name is not None and is_product_column(name)]
+    column_names = [name for _, name in columns]
+    text_columns = [name for name in column_names if name in PRODUCT_COLUMN_DTYPES]
+    selected_rows = ([row[i] if i < len(row) else None for i, _ in columns] for row in rows)
+    filled_rows = (values for values in selected_rows if any(value is not None for value in values))
+    start = 0
+    while True:
+        batch = list(islice(filled_rows, CSV_CHUNK_SIZE))
+        if not batch:
+            if start == 0:
+                yield pd.DataFrame(columns=column_names)
+            return
+        
+        chunk = pd.DataFrame(batch, columns=column_names,
+                             index=pd.RangeIndex(start, start + len(batch)))
+        for name in text_columns:
+            # Match read_csv(dtype=str): numbers become strings, blanks stay missing
+            chunk[name] = chunk[name].where(chunk[name].isna(), chunk[name].astype(str))
+        start += len(batch)
+        yield chunk
+
+def extract_seo_columns(df):
+    """
+    Pull the SEO columns out of a DataFrame once as plain arrays.
+
+    Returns a dict mapping each SEO column name to its NumPy array, or None
+    when the column is absent, so rows can be looked up positionally without
+    building a Series per row. Missing cells come back as None so they are
+    stored as NULL rather than NaN.
+    """
+    return {col: df[col].to_numpy(dtype=object, na_value=None) if col in df.columns else None
+            for col in SEO_COLUMNS}
+
+def build_result_mappings(upload_id, results, df, row_offset=0):
+    """
+    Build ProductUploadResult rows for a batch of processing results.
+    
+    Args:
+        upload_id (int): ID of the UploadHistory record
+        results (list): Results returned by process_data for df
+        df (pandas.DataFrame): The rows the results were produced from
+        row_offset (int): Index of df's first row within the whole file
+        
+    Returns:
+        list: Column mappings suitable for bulk insertion
+    """
+    row_numbers = np.fromiter((result.get('row', 0) for result in results), dtype=np.int64, count=len(results))
+    row_indexes = row_numbers - 2 - row_offset  # Adjust for 0-indexing, header and chunk
+    in_range = (row_indexes >= 0) & (row_indexes < len(df))
+    row_indexes = np.where(in_range, row_indexes, 0)
+    
+    # Gather the SEO data of every result with one fancy-indexing pass per column
+    seo_values = {}
+    for col, values in extract_seo_columns(df).items():
+        if values is None or not len(values):
+            seo_values[col] = [None] * len(results)
+        else:
+            seo_values[col] = np.where(in_range, values[row_indexes], None).tolist()
+    
+    rows = []
+    for i, (result, row_number) in enumerate(zip(results, row_numbers.tolist())):
+        row = {
+            'upload_id': upload_id,
+            'product_title': result.get('product_title', 'Unknown'),
+            'status': result.get('status', 'unknown'),
+            'message': result.get('message', ''),
+            'row_number': row_number,
+            'shopify_product_id': result.get('product_id', None)
+        }
+        for col, values in seo_values.items():
+            row[col] = values[i]
+        rows.append(row)
+    return rows
+
+def save_result_mappings(mappings):
+    """Insert ProductUploadResult rows with a single table-level batched INSERT"""
+    if mappings:
+        db.session.execute(ProductUploadResult.__table__.insert(), mappings)
 
 @app.route('/')
 def index():
     # Get upload history for display on the dashboard
-    recent_uploads = UploadHistory.query.order_by(UploadHistory.upload_date.desc()).limit(5).all()
+    recent_uploads = db.session.execute(
+        select(UploadHistory)
+        .options(load_only(UploadHistory.id, UploadHistory.filename, UploadHistory.upload_date,
+                           UploadHistory.record_count, UploadHistory.success_count,
+                           UploadHistory.error_count))
+        .order_by(UploadHistory.upload_date.desc())
+        .limit(5)
+    ).scalars().all()
     return render_template('index.html', recent_uploads=recent_uploads)
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -52,6 +509,8 @@ def settings():
     if form.validate_on_submit():
         # First test if the new API credentials work
         try:
+            # Test with a client of its own; get_shopify_client() only caches
+            # clients for credentials that have been saved
             shopify_client = ShopifyClient(
                 api_key=form.api_key.data,
                 password=form.password.data,
@@ -69,7 +528,6 @@ def settings():
                     active_settings.password = form.password.data
                     active_settings.store_url = form.store_url.data
                     active_settings.api_version = form.api_version.data
-                    active_settings.last_used_at = datetime.utcnow()
                     active_settings.is_valid = True
                     active_settings.shop_name = response.get('shop', {}).get('name', '')
                     db.session.commit()
@@ -104,7 +562,6 @@ def settings():
                     active_settings.password = form.password.data
                     active_settings.store_url = form.store_url.data
                     active_settings.api_version = form.api_version.data
-                    active_settings.last_used_at = datetime.utcnow()
                     active_settings.is_valid = False
                     db.session.commit()
                 else:
@@ -130,7 +587,6 @@ def settings():
                 active_settings.password = form.password.data
                 active_settings.store_url = form.store_url.data
                 active_settings.api_version = form.api_version.data
-                active_settings.last_used_at = datetime.utcnow()
                 active_settings.is_valid = False
                 db.session.commit()
             else:
@@ -144,6 +600,7 @@ def settings():
                 db.session.add(new_settings)
                 db.session.commit()
         
+        invalidate_settings_cache()
         return redirect(url_for('main.settings'))
     
     # Pre-fill the form with existing settings if available
@@ -156,11 +613,11 @@ def settings():
         # Test existing connection if we have settings
         if not connection_status and active_settings.api_key and active_settings.password and active_settings.store_url:
             try:
-                shopify_client = ShopifyClient(
-                    api_key=active_settings.api_key,
-                    password=active_settings.password,
-                    store_url=active_settings.store_url,
-                    api_version=active_settings.api_version
+                shopify_client = get_shopify_client(
+                    active_settings.api_key,
+                    active_settings.password,
+                    active_settings.store_url,
+                    active_settings.api_version
                 )
                 is_valid, response = shopify_client.test_connection()
                 
@@ -177,6 +634,7 @@ def settings():
                         active_settings.is_valid = True
                         active_settings.shop_name = response.get('shop', {}).get('name', '')
                         db.session.commit()
+                        invalidate_settings_cache()
                         
                 else:
                     connection_status = {
@@ -188,6 +646,7 @@ def settings():
                     if active_settings.is_valid:
                         active_settings.is_valid = False
                         db.session.commit()
+                        invalidate_settings_cache()
             except Exception as e:
                 logger.error(f"Error testing existing Shopify API connection: {str(e)}")
                 connection_status = {
@@ -199,13 +658,14 @@ def settings():
                 if active_settings.is_valid:
                     active_settings.is_valid = False
                     db.session.commit()
+                    invalidate_settings_cache()
     
     return render_template('settings.html', form=form, connection_status=connection_status)
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     # Check if Shopify settings exist in the database
-    active_settings = ShopifySettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_shopify_settings()
     if not active_settings:
         flash('Please configure your Shopify API settings first.', 'warning')
         return redirect(url_for('main.settings'))
@@ -215,43 +675,64 @@ def upload():
     if form.validate_on_submit():
         file = form.file.data
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            filename = safe_filename(file.filename)
+            cache_path = None
             
             try:
-                # Process the file based on its extension
-                file_type = filename.rsplit('.', 1)[1].lower()
-                if file_type == 'csv':
-                    df = pd.read_csv(filepath)
-                else:  # Excel file
-                    df = pd.read_excel(filepath)
+                # Parse the upload stream directly, validate it chunk by chunk and
+                # cache the validated product columns as a plain CSV file, so the
+                # background task reads a clean file instead of the original upload
+                file_type = file_extension(filename)
+                os.makedirs(FRAME_CACHE_FOLDER, exist_ok=True)
+                cache_fd, cache_path = tempfile.mkstemp(dir=FRAME_CACHE_FOLDER, suffix='.tmp')
+                record_count = 0
+                with os.fdopen(cache_fd, 'w', newline='') as cache_file:
+                    for chunk in iter_product_frames(file.stream, file_type):
+                        validation_result = validate_data(chunk)
+                        if not validation_result['valid']:
+                            cache_file.close()
+                            os.remove(cache_path)
+                            flash(f"Data validation failed: {validation_result['errors']}", 'danger')
+                            return render_template('upload.html', form=form)
+                        chunk.to_csv(cache_file, header=record_count == 0, index=False)
+                        record_count += len(chunk)
                 
-                # Validate the data
-                validation_result = validate_data(df)
-                if not validation_result['valid']:
-                    flash(f"Data validation failed: {validation_result['errors']}", 'danger')
-                    return render_template('upload.html', form=form)
-                
-                # Create an upload history record
-                upload_history = UploadHistory(
-                    filename=filename,
-                    file_type=file_type,
-                    record_count=len(df),
-                    settings_id=active_settings.id
-                )
-                db.session.add(upload_history)
+                # Create an upload history record; RETURNING hands back the id
+                # without reloading the expired row after the commit
+                upload_id = db.session.execute(
+                    insert(UploadHistory).values(
+                        filename=filename,
+                        file_type=file_type,
+                        record_count=record_count,
+                        settings_id=active_settings.id,
+                        status='pending'
+                    ).returning(UploadHistory.id)
+                ).scalar_one()
                 db.session.commit()
+                os.replace(cache_path, frame_cache_path(upload_id))
+                cache_path = None
                 
-                # Store data for processing
-                session['file_path'] = filepath
-                session['upload_id'] = upload_history.id
+                # An earlier upload that was never processed is replaced by this one
+                previous_upload_id = session.get('upload_id')
+                if previous_upload_id:
+                    discard_frame_cache(previous_upload_id)
+                    db.session.execute(update(UploadHistory).where(
+                        UploadHistory.id == previous_upload_id,
+                        UploadHistory.status == 'pending'
+                    ).values(status='failed', error_message='Replaced by a newer upload before processing'))
+                    db.session.commit()
+                
+                # Store data for processing; the cached rows are found by upload ID
+                session['upload_id'] = upload_id
                 
                 # Process the data and upload to Shopify
                 return redirect(url_for('main.process'))
                 
             except Exception as e:
                 logger.error(f"Error processing file: {str(e)}")
+                # Don't leave a partial frame cache behind
+                if cache_path and os.path.exists(cache_path):
+                    os.remove(cache_path)
                 flash(f'Error processing file: {str(e)}', 'danger')
                 return render_template('upload.html', form=form)
         else:
@@ -261,15 +742,16 @@ def upload():
 
 @app.route('/process')
 def process():
-    # Check if file path exists in session
-    if 'file_path' not in session or 'upload_id' not in session:
+    # Check if an upload is waiting in the session
+    if 'upload_id' not in session:
         flash('No file uploaded. Please upload a file first.', 'warning')
         return redirect(url_for('main.upload'))
     
     # Get the upload history record
     upload_id = session.get('upload_id')
     upload_history = UploadHistory.query.get(upload_id)
-    if not upload_history:
+    if not upload_history or upload_history.status != 'pending':
+        session.pop('upload_id', None)
         flash('Upload record not found. Please try again.', 'danger')
         return redirect(url_for('main.upload'))
     
@@ -279,79 +761,105 @@ def process():
         flash('Shopify settings not found. Please configure your settings first.', 'danger')
         return redirect(url_for('main.settings'))
     
-    # Initialize Shopify client
-    shopify_client = ShopifyClient(
-        active_settings.api_key,
-        active_settings.password,
-        active_settings.store_url,
-        active_settings.api_version
-    )
+    # Upload the products in the background and show the progress page
+    upload_history.status = 'processing'
+    db.session.commit()
+    tasks.submit(run_product_upload, upload_id)
+    session.pop('upload_id', None)
     
+    return redirect(url_for('main.upload_results', upload_id=upload_id))
+
+def run_product_upload(upload_id):
+    """
+    Upload the products of an uploaded file to Shopify (background task).
+    
+    Results are stored and the upload's counts updated after every chunk, so
+    the results page can show progress while the upload runs.
+    
+    Args:
+        upload_id (int): ID of the UploadHistory record whose rows upload() cached
+    """
+    cache_path = frame_cache_path(upload_id)
+    upload_history = db.session.get(UploadHistory, upload_id)
     try:
-        # Read the file
-        file_path = session['file_path']
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:  # Excel file
-            df = pd.read_excel(file_path)
-        
-        # Process and upload the data to Shopify
-        results = process_data(df, shopify_client)
-        
-        # Update the upload history with success/error counts
-        success_count = sum(1 for result in results if result['status'] == 'success')
-        error_count = sum(1 for result in results if result['status'] == 'error')
-        
-        upload_history.success_count = success_count
-        upload_history.error_count = error_count
-        db.session.commit()
+        active_settings = db.session.get(ShopifySettings, upload_history.settings_id)
+        if not active_settings:
+            raise ValueError(f"Shopify settings {upload_history.settings_id} not found")
+        shopify_client = get_shopify_client(
+            active_settings.api_key,
+            active_settings.password,
+            active_settings.store_url,
+            active_settings.api_version
+        )
         
-        # Store the results in the database
-        for result in results:
-            row_number = result.get('row', 0)
-            row_index = row_number - 2  # Adjust for 0-indexing and header
+        # Read the rows cached by upload() in chunks and upload each one to Shopify
+        status_counts = Counter()
+        for chunk in iter_product_frames(cache_path, 'csv'):
+            chunk_results = process_data(chunk, shopify_client,
+                                         concurrency=min(SHOPIFY_UPLOAD_CONCURRENCY, len(chunk)))
+            status_counts.update(result['status'] for result in chunk_results)
             
-            # Extract SEO data from the row if it exists
-            seo_data = {}
-            if 0 <= row_index < len(df):
-                row_data = df.iloc[row_index]
-                seo_data = {
-                    'meta_title': row_data.get('meta_title', None),
-                    'meta_description': row_data.get('meta_description', None),
-                    'meta_keywords': row_data.get('meta_keywords', None),
-                    'url_handle': row_data.get('url_handle', None),
-                    'category_hierarchy': row_data.get('category_hierarchy', None)
-                }
-            
-            # Create a product upload result record
-            product_result = ProductUploadResult(
-                upload_id=upload_id,
-                product_title=result.get('product_title', 'Unknown'),
-                status=result.get('status', 'unknown'),
-                message=result.get('message', ''),
-                row_number=row_number,
-                shopify_product_id=result.get('product_id', None),
-                meta_title=seo_data.get('meta_title'),
-                meta_description=seo_data.get('meta_description'),
-                meta_keywords=seo_data.get('meta_keywords'),
-                url_handle=seo_data.get('url_handle'),
-                category_hierarchy=seo_data.get('category_hierarchy')
-            )
-            db.session.add(product_result)
+            # Store the results of this chunk and the running counts
+            row_offset = chunk.index[0] if len(chunk) else 0
+            save_result_mappings(build_result_mappings(upload_id, chunk_results, chunk, row_offset))
+            upload_history.success_count = status_counts['success']
+            upload_history.error_count = status_counts['error']
+            db.session.commit()
         
+        upload_history.status = 'completed'
         db.session.commit()
-        
-        # Clean up session data
-        session.pop('file_path', None)
-        session.pop('upload_id', None)
-        
-        # Render the results page
-        return render_template('results.html', results=results, upload=upload_history)
-        
     except Exception as e:
-        logger.error(f"Error processing data: {str(e)}")
-        flash(f'Error processing data: {str(e)}', 'danger')
-        return redirect(url_for('main.upload'))
+        db.session.rollback()
+        logger.exception(f"Error processing upload {upload_id}: {str(e)}", extra={'upload_id': upload_id})
+        upload_history.status = 'failed'
+        upload_history.error_message = str(e)
+        db.session.commit()
+    finally:
+        # Clean up the cached rows
+        discard_frame_cache(upload_id)
+
+def stored_upload_results(upload_id):
+    """Load the stored results of an upload in the shape used by results.html"""
+    rows = db.session.execute(
+        select(ProductUploadResult)
+        .where(ProductUploadResult.upload_id == upload_id)
+        .order_by(ProductUploadResult.row_number)
+    ).scalars()
+    return [{
+        'row': row.row_number,
+        'product_title': row.product_title,
+        'product_id': row.shopify_product_id,
+        'status': row.status,
+        'message': row.message,
+        'seo_data': {col: getattr(row, col) for col in SEO_COLUMNS},
+    } for row in rows]
+
+@app.route('/upload/results/<int:upload_id>')
+def upload_results(upload_id):
+    """Route for the results page of a product upload"""
+    upload_history = db.get_or_404(UploadHistory, upload_id)
+    
+    # Results are only listed once the background upload has finished
+    results = []
+    if upload_history.status not in ('pending', 'processing'):
+        results = stored_upload_results(upload_id)
+    
+    # Stream the results page so rows are sent as they are rendered
+    return Response(stream_template('results.html', results=results, upload=upload_history),
+                    mimetype='text/html')
+
+@app.route('/upload/status/<int:upload_id>')
+def upload_status(upload_id):
+    """API endpoint to poll the progress of a product upload"""
+    upload_history = db.get_or_404(UploadHistory, upload_id)
+    return jsonify({
+        'id': upload_history.id,
+        'status': upload_history.status,
+        'record_count': upload_history.record_count,
+        'success_count': upload_history.success_count,
+        'error_count': upload_history.error_count,
+        'error': upload_history.error_message
+    })
 
 @app.route('/ai/settings', methods=['GET', 'POST'])
 def ai_settings():
@@ -366,7 +874,6 @@ def ai_settings():
         if active_settings:
             active_settings.api_provider = form.api_provider.data
             active_settings.api_key = form.api_key.data
-            active_settings.last_used_at = datetime.utcnow()
             db.session.commit()
         else:
             new_settings = AISettings(
@@ -376,6 +883,7 @@ def ai_settings():
             db.session.add(new_settings)
             db.session.commit()
         
+        invalidate_settings_cache()
         flash('AI API settings saved successfully!', 'success')
         return redirect(url_for('main.ai_settings'))
     
@@ -397,7 +905,7 @@ def ai_generator():
         logger.info(f'Files received: {request.files}')
     
     # Check if AI settings exist in the database
-    active_settings = AISettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_ai_settings()
     logger.info(f'Active AI settings found: {bool(active_settings)}')
     form = AIGeneratorForm()
     
@@ -408,8 +916,7 @@ def ai_generator():
         
         try:
             # Initialize the AI Service
-            ai_service = AIService(api_key=active_settings.api_key, 
-                                 api_provider=active_settings.api_provider)
+            ai_service = get_ai_service(active_settings.api_key, active_settings.api_provider)
             
             # Record the start time for performance tracking
             start_time = time.time()
@@ -443,7 +950,7 @@ def ai_generator():
                 
                 # Add the extracted image URLs to the result
                 if image_urls:
-                    result['csv_data']['image_urls'] = image_urls
+                    result['image_urls'] = image_urls
             
             # For text description input
             elif input_type == 'text':
@@ -486,31 +993,27 @@ def ai_generator():
             # Calculate generation time
             generation_time = time.time() - start_time
             
-            # Extract generated data
-            csv_data = result['csv_data']
-            
-            # Store the data in the session for preview and download
-            # Convert DataFrame to CSV string and store in session
-            csv_string = csv_data.to_csv(index=False)
-            
-            # Create a temporary file with the CSV data
+            # Write the generated rows to a temporary CSV file for download
             temp_csv_fd, temp_csv_path = tempfile.mkstemp(suffix='.csv')
-            with os.fdopen(temp_csv_fd, 'w') as f:
-                f.write(csv_string)
+            os.close(temp_csv_fd)
+            write_rows_csv(result['csv_data'], temp_csv_path)
             
-            # Store paths and metadata in session
+            # Keep the generated data server-side and only its key in the session
+            result_store.delete(session.get('ai_gen_key'))
             session['ai_generated_csv_path'] = temp_csv_path
-            session['ai_generated_product_data'] = json.dumps(result, default=str)
-            session['ai_generation_stats'] = {
-                'product_count': result.get('product_count', 1),
-                'variant_count': result.get('variant_count', 0),
-                'image_count': result.get('image_count', 0),
-                'generation_time': generation_time
-            }
-            
-            # If image URLs were extracted, store them in the session
-            if 'image_urls' in result:
-                session['ai_generated_image_urls'] = result['image_urls']
+            session['ai_gen_key'] = result_store.save({
+                'product_data': result,
+                'generation_stats': {
+                    'product_count': result.get('product_count', 1),
+                    'variant_count': result.get('variant_count', 0),
+                    'image_count': result.get('image_count', 0),
+                    'generation_time': generation_time
+                },
+                # Preview rows are built once here instead of on every preview hit
+                'csv_preview': build_csv_preview(result['csv_data']),
+                # If image URLs were extracted, store them with the generated data
+                'image_urls': result.get('image_urls', [])
+            })
             
             # Redirect to the preview page
             return redirect(url_for('main.ai_preview'))
@@ -530,16 +1033,16 @@ def ai_generator():
 def ai_preview():
     """Route for previewing AI-generated product data"""
     # Check if AI settings exist in the database
-    active_settings = AISettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_ai_settings()
     
-    # Check if generated data exists in the session
-    if 'ai_generated_product_data' not in session:
+    # Check if generated data exists in the server-side store
+    generated = result_store.load(session.get('ai_gen_key'))
+    if not generated:
         flash('No generated data found. Please generate product data first.', 'warning')
         return redirect(url_for('main.ai_generator'))
     
     try:
-        # Load the generated data from the session
-        product_data = json.loads(session['ai_generated_product_data'])
+        product_data = generated['product_data']
         
         # Get the CSV path
         csv_path = session.get('ai_generated_csv_path')
@@ -547,23 +1050,21 @@ def ai_preview():
             flash('CSV file not found. Please generate product data again.', 'warning')
             return redirect(url_for('main.ai_generator'))
         
-        # Read the CSV file for preview
-        df = pd.read_csv(csv_path)
-        
-        # Prepare CSV preview data (first 5 rows)
-        csv_preview = df.head(5).values.tolist()
-        csv_columns = df.columns.tolist()
+        # Use the preview stored at generation time, or build it from the stored rows
+        preview = generated.get('csv_preview') or build_csv_preview(product_data.get('csv_data') or [])
+        csv_columns = preview['columns']
+        csv_preview = preview['rows']
         
         # Get generation stats
-        generation_stats = session.get('ai_generation_stats', {
+        generation_stats = generated.get('generation_stats') or {
             'product_count': 1,
             'variant_count': 0,
             'image_count': 0,
             'generation_time': 0
-        })
+        }
         
         # Get image URLs if available
-        image_urls = session.get('ai_generated_image_urls', [])
+        image_urls = generated.get('image_urls', [])
         
         return render_template('ai_preview.html', 
                                product_data=product_data,
@@ -592,19 +1093,33 @@ def download_generated_csv():
     
     try:
         # Generate a filename based on the product data
-        if 'ai_generated_product_data' in session:
-            product_data = json.loads(session['ai_generated_product_data'])
-            product_title = product_data.get('product_title', 'product').lower()
+        generated = result_store.load(session.get('ai_gen_key'))
+        if generated:
+            product_data = generated['product_data']
             # Clean up product title for filename
-            filename = f"{product_title.replace(' ', '_')[:30]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            product_title = slugify(str(product_data.get('product_title', 'product'))) or 'product'
+            filename = f"{product_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         else:
             filename = f"shopify_product_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
-        # Send the file to the client
+        # Behind nginx, let it send the file from an internal location mapped
+        # to the temp folder so the worker is freed immediately
+        accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+        if accel_prefix:
+            response = Response(mimetype='text/csv')
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{os.path.basename(csv_path)}"
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        
+        # Send the file to the client; conditional requests let unchanged
+        # files be answered with 304 and the WSGI file wrapper use sendfile()
         return send_file(csv_path, 
                         mimetype='text/csv',
                         as_attachment=True,
-                        download_name=filename)
+                        download_name=filename,
+                        conditional=True,
+                        etag=True,
+                        last_modified=os.path.getmtime(csv_path))
     except Exception as e:
         logger.error(f"Error downloading CSV: {str(e)}")
         flash(f'Error downloading CSV: {str(e)}', 'danger')
@@ -613,26 +1128,32 @@ def download_generated_csv():
 @app.route('/ai/upload_to_shopify')
 def upload_generated_product():
     """Route for uploading the AI-generated product to Shopify"""
-    # Check if CSV path exists in session
-    if 'ai_generated_csv_path' not in session:
+    # Check if generated data exists in session
+    if 'ai_gen_key' not in session and 'ai_generated_csv_path' not in session:
         flash('No generated data found. Please generate product data first.', 'warning')
         return redirect(url_for('main.ai_generator'))
     
     # Check if Shopify settings exist in the database
-    active_settings = ShopifySettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_shopify_settings()
     if not active_settings:
         flash('Please configure your Shopify API settings first.', 'warning')
         return redirect(url_for('main.settings'))
     
     try:
-        # Get the CSV path
-        csv_path = session.get('ai_generated_csv_path')
-        if not csv_path or not os.path.exists(csv_path):
-            flash('CSV file not found. Please generate product data again.', 'warning')
-            return redirect(url_for('main.ai_generator'))
-        
-        # Read the CSV file
-        df = pd.read_csv(csv_path)
+        # Build the DataFrame from the stored rows; the CSV file is only
+        # parsed when the stored data has expired
+        generated = result_store.load(session.get('ai_gen_key'))
+        rows = generated['product_data'].get('csv_data') if generated else None
+        if rows:
+            # Blank cells become NaN as read_csv() makes them, so process_data()
+            # doesn't send empty image URLs or metafields
+            df = pd.DataFrame.from_records(rows).replace('', np.nan)
+        else:
+            csv_path = session.get('ai_generated_csv_path')
+            if not csv_path or not os.path.exists(csv_path):
+                flash('CSV file not found. Please generate product data again.', 'warning')
+                return redirect(url_for('main.ai_generator'))
+            df = read_csv_file(csv_path)
         
         # Create an upload history record
         upload_history = UploadHistory(
@@ -644,8 +1165,8 @@ def upload_generated_product():
         db.session.add(upload_history)
         db.session.commit()
         
-        # Initialize Shopify client
-        shopify_client = ShopifyClient(
+        # Get the shared Shopify client for these credentials
+        shopify_client = get_shopify_client(
             active_settings.api_key,
             active_settings.password,
             active_settings.store_url,
@@ -653,60 +1174,26 @@ def upload_generated_product():
         )
         
         # Process and upload the data to Shopify
-        results = process_data(df, shopify_client)
+        results = process_data(df, shopify_client,
+                               concurrency=min(SHOPIFY_UPLOAD_CONCURRENCY, len(df)))
         
         # Update the upload history with success/error counts
-        success_count = sum(1 for result in results if result['status'] == 'success')
-        error_count = sum(1 for result in results if result['status'] == 'error')
-        
-        upload_history.success_count = success_count
-        upload_history.error_count = error_count
+        status_counts = Counter(result['status'] for result in results)
+        upload_history.success_count = status_counts['success']
+        upload_history.error_count = status_counts['error']
         db.session.commit()
         
         # Store the results in the database
-        upload_id = upload_history.id
-        for result in results:
-            row_number = result.get('row', 0)
-            row_index = row_number - 2  # Adjust for 0-indexing and header
-            
-            # Extract SEO data from the row if it exists
-            seo_data = {}
-            if 0 <= row_index < len(df):
-                row_data = df.iloc[row_index]
-                seo_data = {
-                    'meta_title': row_data.get('meta_title', None),
-                    'meta_description': row_data.get('meta_description', None),
-                    'meta_keywords': row_data.get('meta_keywords', None),
-                    'url_handle': row_data.get('url_handle', None),
-                    'category_hierarchy': row_data.get('category_hierarchy', None)
-                }
-            
-            # Create a product upload result record
-            product_result = ProductUploadResult(
-                upload_id=upload_id,
-                product_title=result.get('product_title', 'Unknown'),
-                status=result.get('status', 'unknown'),
-                message=result.get('message', ''),
-                row_number=row_number,
-                shopify_product_id=result.get('product_id', None),
-                meta_title=seo_data.get('meta_title'),
-                meta_description=seo_data.get('meta_description'),
-                meta_keywords=seo_data.get('meta_keywords'),
-                url_handle=seo_data.get('url_handle'),
-                category_hierarchy=seo_data.get('category_hierarchy')
-            )
-            db.session.add(product_result)
-        
+        save_result_mappings(build_result_mappings(upload_history.id, results, df))
         db.session.commit()
         
-        # Clear the AI-generated data from session
+        # Clear the AI-generated data from session and the server-side store
         session.pop('ai_generated_csv_path', None)
-        session.pop('ai_generated_product_data', None)
-        session.pop('ai_generation_stats', None)
-        session.pop('ai_generated_image_urls', None)
+        result_store.delete(session.pop('ai_gen_key', None))
         
-        # Render the results page
-        return render_template('results.html', results=results, upload=upload_history)
+        # Stream the results page so rows are sent as they are rendered
+        return Response(stream_template('results.html', results=results, upload=upload_history),
+                        mimetype='text/html')
         
     except Exception as e:
         logger.error(f"Error uploading generated product to Shopify: {str(e)}")
@@ -727,15 +1214,11 @@ def regenerate_product():
 def blog_generator():
     """Route for the AI blog post generator"""
     # Check if AI settings exist in the database
-    active_settings = AISettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_ai_settings()
     form = BlogPostGeneratorForm()
     
     # Get blog post statistics for the sidebar
-    stats = {
-        'total_posts': BlogPost.query.count(),
-        'published_posts': BlogPost.query.filter_by(status='published').count(),
-        'draft_posts': BlogPost.query.filter_by(status='draft').count()
-    }
+    stats = get_blog_post_stats()
     
     if form.validate_on_submit():
         if not active_settings:
@@ -743,13 +1226,6 @@ def blog_generator():
             return redirect(url_for('main.ai_settings'))
         
         try:
-            # Initialize the AI Service
-            ai_service = AIService(api_key=active_settings.api_key, 
-                                 api_provider=active_settings.api_provider)
-            
-            # Record the start time for performance tracking
-            start_time = time.time()
-            
             # Extract form data
             blog_params = {
                 'title': form.title.data,
@@ -766,56 +1242,28 @@ def blog_generator():
                 'seo_optimize': form.seo_optimize.data
             }
             
-            # Generate the blog post content
-            blog_data = ai_service.generate_blog_post(blog_params)
-            
-            # Generate featured image if requested
-            if form.generate_image.data:
-                featured_image_url = ai_service.generate_blog_image(
-                    blog_data.get('title', ''), 
-                    blog_data.get('summary', '')
-                )
-                if featured_image_url:
-                    blog_data['featured_image_url'] = featured_image_url
-            
-            # Create a new BlogPost record in the database
+            # Create a placeholder BlogPost record that the background job fills in
             blog_post = BlogPost(
-                title=blog_data.get('title', ''),
-                content=blog_data.get('content', ''),
-                summary=blog_data.get('summary', ''),
-                featured_image_url=blog_data.get('featured_image_url'),
-                status='draft',
-                meta_title=blog_data.get('meta_title', ''),
-                meta_description=blog_data.get('meta_description', ''),
-                meta_keywords=blog_data.get('meta_keywords', ''),
-                url_handle=blog_data.get('url_handle', ''),
-                tags=','.join(blog_data.get('tags', [])) if isinstance(blog_data.get('tags'), list) else blog_data.get('tags', ''),
-                category=blog_data.get('category', ''),
+                title=form.title.data or form.topic.data or 'Generating blog post',
+                content='',
+                status='generating',
                 topic=form.topic.data,
                 keywords=form.keywords.data,
                 tone=form.tone.data,
                 target_audience=form.target_audience.data,
-                word_count=form.word_count.data,
-                created_at=datetime.utcnow()
+                word_count=form.word_count.data
             )
             
             db.session.add(blog_post)
             db.session.commit()
+            invalidate_blog_stats_cache()
             
-            # Store generation metadata
-            generation_time = time.time() - start_time
-            
-            # Store blog data in session for display
+            # Generate the content in the background so the request returns right away
+            tasks.submit(tasks.generate_blog_post_task, blog_post.id, blog_params,
+                         form.generate_image.data, active_settings.id)
             session['blog_post_id'] = blog_post.id
-            session['blog_generation_time'] = generation_time
-            session['blog_generation_stats'] = {
-                'word_count': blog_data.get('word_count', form.word_count.data or 1000),
-                'estimated_reading_time': blog_data.get('estimated_reading_time', 5),
-                'has_featured_image': bool(blog_data.get('featured_image_url')),
-                'generation_time': generation_time
-            }
             
-            # Redirect to the preview page
+            # Redirect to the preview page, which refreshes until generation finishes
             return redirect(url_for('main.blog_preview', post_id=blog_post.id))
             
         except Exception as e:
@@ -829,10 +1277,11 @@ def blog_generator():
 def blog_preview(post_id):
     """Route for previewing the AI-generated blog post"""
     # Retrieve the blog post from the database
-    blog_post = BlogPost.query.get_or_404(post_id)
+    blog_post = db.get_or_404(BlogPost, post_id)
+    expire_stalled_task(blog_post)
     
-    # Get generation stats from session if available
-    generation_stats = session.get('blog_generation_stats', {})
+    # Get generation stats recorded by the background generation
+    generation_stats = blog_post.generation_stats or {}
     
     return render_template('blog_preview.html', 
                           blog_post=blog_post, 
@@ -841,8 +1290,8 @@ def blog_preview(post_id):
 @app.route('/blog/edit/<int:post_id>', methods=['GET', 'POST'])
 def edit_blog_post(post_id):
     """Route for editing a blog post before publishing"""
-    # Retrieve the blog post from the database
-    blog_post = BlogPost.query.get_or_404(post_id)
+    # Make sure the blog post exists
+    db.get_or_404(BlogPost, post_id)
     
     # Todo: Implement the edit page
     # For now, redirect to preview
@@ -852,133 +1301,54 @@ def edit_blog_post(post_id):
 @app.route('/blog/publish/<int:post_id>')
 def publish_blog_post(post_id):
     """Route for publishing the blog post to Shopify"""
-    # Retrieve the blog post from the database
-    blog_post = BlogPost.query.get_or_404(post_id)
+    # Retrieve the blog post and the active Shopify settings from the database
+    blog_post, active_settings = get_or_404_with_shopify_settings(BlogPost, post_id)
+    
+    preview_url = url_for('main.blog_preview', post_id=post_id)
+    status_url = url_for('main.blog_post_status', post_id=post_id)
     
     # Check if Shopify settings exist
-    active_settings = ShopifySettings.query.filter_by(is_active=True).first()
     if not active_settings:
-        flash('Please configure your Shopify API settings first.', 'warning')
-        return redirect(url_for('main.settings'))
+        return publish_reply('error', 'Please configure your Shopify API settings first.', 'warning',
+                             url_for('main.settings'), status_code=400)
+    
+    if blog_post.status == 'publishing' and not expire_stalled_task(blog_post):
+        return publish_reply('publishing', 'This blog post is already being published to Shopify.', 'info',
+                             preview_url, status_url)
+    
+    # Skip the Shopify calls when nothing changed since the last publish
+    if (blog_post.status == 'published' and
+            tasks.is_unchanged_since_publish('blog', post_id, tasks.build_article_data(blog_post)['article'])):
+        return publish_reply('unchanged', 'No changes since the last publish.', 'info',
+                             preview_url, status_url, status_code=200)
+    
+    # Mark the post as publishing and hand the Shopify calls to a background worker
+    blog_post.status = 'publishing'
+    blog_post.publish_error = None
+    db.session.commit()
+    invalidate_blog_stats_cache()
+    tasks.submit(tasks.publish_blog_post_task, post_id, active_settings.id)
     
-    try:
-        # Initialize Shopify client
-        shopify_client = ShopifyClient(
-            active_settings.api_key,
-            active_settings.password,
-            active_settings.store_url,
-            active_settings.api_version
-        )
-        
-        # First, check if we need to get the blog ID or if already have it
-        blog_id = None
-        if blog_post.shopify_blog_id:
-            blog_id = blog_post.shopify_blog_id
-        else:
-            # Get available blogs from the shop
-            blogs_response = shopify_client.get_blogs()
-            
-            if blogs_response and 'blogs' in blogs_response and blogs_response['blogs']:
-                # Use the first blog by default
-                blog_id = blogs_response['blogs'][0]['id']
-                
-                # Or try to find a blog with a name that contains 'blog', 'news', or 'article'
-                for blog in blogs_response['blogs']:
-                    blog_title = blog.get('title', '').lower()
-                    if 'blog' in blog_title or 'news' in blog_title or 'article' in blog_title:
-                        blog_id = blog['id']
-                        break
-            
-            # If no blogs found, create one
-            if not blog_id:
-                new_blog_data = {
-                    'blog': {
-                        'title': 'Store Blog',
-                        'commentable': 'moderate'
-                    }
-                }
-                blog_response = shopify_client.create_blog(new_blog_data)
-                if blog_response and 'blog' in blog_response:
-                    blog_id = blog_response['blog']['id']
-                else:
-                    raise Exception("Failed to create a blog in Shopify")
-        
-        # Prepare the article data
-        article_data = {
-            'article': {
-                'title': blog_post.title,
-                'author': blog_post.author or 'Store Admin',
-                'body_html': blog_post.content,
-                'published': True,
-                'published_at': blog_post.publish_date.isoformat() if blog_post.publish_date else datetime.utcnow().isoformat(),
-                'summary_html': blog_post.summary or '',
-                'tags': blog_post.tags or '',
-                'handle': blog_post.url_handle or None,
-                'metafields': []
-            }
-        }
-        
-        # Add metafields for SEO if available
-        if blog_post.meta_title:
-            article_data['article']['metafields'].append({
-                'namespace': 'global',
-                'key': 'title_tag',
-                'value': blog_post.meta_title,
-                'type': 'single_line_text_field'
-            })
-            
-        if blog_post.meta_description:
-            article_data['article']['metafields'].append({
-                'namespace': 'global',
-                'key': 'description_tag',
-                'value': blog_post.meta_description,
-                'type': 'single_line_text_field'
-            })
-        
-        # Add featured image if available
-        if blog_post.featured_image_url:
-            article_data['article']['image'] = {
-                'src': blog_post.featured_image_url
-            }
-        
-        # Create or update the article in Shopify
-        if blog_post.shopify_post_id:
-            # Update existing post
-            response = shopify_client.update_article(
-                blog_id, 
-                blog_post.shopify_post_id, 
-                article_data
-            )
-        else:
-            # Create new post
-            response = shopify_client.create_article(blog_id, article_data)
-        
-        # Update local data with Shopify IDs
-        if response and 'article' in response:
-            blog_post.shopify_blog_id = str(blog_id)
-            blog_post.shopify_post_id = str(response['article']['id'])
-            blog_post.status = 'published'
-            blog_post.publish_date = datetime.utcnow()
-            blog_post.settings_id = active_settings.id
-            db.session.commit()
-            
-            flash('Blog post published to Shopify successfully!', 'success')
-        else:
-            raise Exception("Failed to publish article to Shopify")
-        
-        return redirect(url_for('main.blog_preview', post_id=post_id))
-        
-    except Exception as e:
-        logger.error(f"Error publishing blog post to Shopify: {str(e)}")
-        flash(f'Error publishing to Shopify: {str(e)}', 'danger')
-        return redirect(url_for('main.blog_preview', post_id=post_id))
+    return publish_reply('queued', 'Publishing blog post to Shopify...', 'info', preview_url, status_url)
+
+@app.route('/blog/status/<int:post_id>')
+def blog_post_status(post_id):
+    """API endpoint to poll the generation/publish status of a blog post"""
+    blog_post = db.get_or_404(BlogPost, post_id)
+    expire_stalled_task(blog_post)
+    return jsonify({
+        'id': blog_post.id,
+        'status': blog_post.status,
+        'error': blog_post.generation_error if blog_post.status == 'generation_failed' else blog_post.publish_error
+    })
 
 @app.route('/blog/regenerate/<int:post_id>')
 def regenerate_blog_post(post_id=None):
     """Route for regenerating a blog post with different parameters"""
     # If a post ID is provided, store its parameters for pre-filling the form
     if post_id:
-        blog_post = BlogPost.query.get_or_404(post_id)
+        if db.session.get(BlogPost, post_id, options=[load_only(BlogPost.id)]) is None:
+            abort(404)
         # Todo: Store parameters in session for pre-filling the form
     
     # Redirect to the generator page
@@ -990,7 +1360,7 @@ def regenerate_blog_post(post_id=None):
 def page_generator():
     """Route for the page content generator form"""
     # Check if AI settings exist in the database
-    active_settings = AISettings.query.filter_by(is_active=True).first()
+    active_settings = get_active_ai_settings()
     form = PageGeneratorForm()
     
     if form.validate_on_submit():
@@ -999,13 +1369,6 @@ def page_generator():
             return redirect(url_for('main.ai_settings'))
         
         try:
-            # Initialize the AI Service
-            ai_service = AIService(api_key=active_settings.api_key, 
-                                  api_provider=active_settings.api_provider)
-            
-            # Record the start time for performance tracking
-            start_time = time.time()
-            
             # Collect all form data into a dictionary
             page_params = {
                 'page_type': form.page_type.data,
@@ -1027,33 +1390,25 @@ def page_generator():
                 'generate_image': form.generate_image.data
             }
             
-            # Generate page content
-            result = ai_service.generate_page_content(page_params)
-            
-            # Calculate generation time
-            generation_time = time.time() - start_time
-            
-            # Create a new PageContent record
+            # Create a placeholder PageContent record that the background job fills in
             page_content = PageContent(
                 page_type=page_params['page_type'],
-                title=result.get('title', ''),
-                content=result.get('content', ''),
-                meta_title=result.get('meta_title', ''),
-                meta_description=result.get('meta_description', ''),
-                meta_keywords=result.get('meta_keywords', ''),
+                title=page_params['title'] or 'Generating page',
+                content='',
                 published=False,
-                generation_time=generation_time,
-                image_url=result.get('image_url', '')
+                status='generating',
+                # Save the original parameters as JSON for potential regeneration
+                parameters=json.dumps(page_params, separators=(',', ':'))
             )
             
-            # Save the original parameters as JSON for potential regeneration
-            page_content.parameters = json.dumps(page_params)
-            
             # Save to database
             db.session.add(page_content)
             db.session.commit()
             
-            # Redirect to the preview page
+            # Generate the content in the background so the request returns right away
+            tasks.submit(tasks.generate_page_content_task, page_content.id, page_params, active_settings.id)
+            
+            # Redirect to the preview page, which refreshes until generation finishes
             return redirect(url_for('main.page_preview', page_id=page_content.id))
             
         except Exception as e:
@@ -1065,11 +1420,12 @@ def page_generator():
 @app.route('/page/preview/<int:page_id>')
 def page_preview(page_id):
     """Route for previewing generated page content"""
-    # Get the page content record
-    page_content = PageContent.query.get_or_404(page_id)
+    # Get the page content record and the active Shopify settings
+    page_content, active_settings = get_or_404_with_shopify_settings(PageContent, page_id)
+    expire_stalled_task(page_content)
     
     # Check if shopify settings exist for the publish button
-    has_shopify_settings = ShopifySettings.query.filter_by(is_active=True).first() is not None
+    has_shopify_settings = active_settings is not None
     
     return render_template('page_preview.html', 
                           page=page_content, 
@@ -1078,68 +1434,53 @@ def page_preview(page_id):
 @app.route('/page/publish/<int:page_id>')
 def publish_page(page_id):
     """Route for publishing a page to Shopify"""
-    # Get the page content record
-    page_content = PageContent.query.get_or_404(page_id)
+    # Get the page content record and the Shopify settings
+    page_content, active_settings = get_or_404_with_shopify_settings(PageContent, page_id)
+    
+    preview_url = url_for('main.page_preview', page_id=page_id)
+    status_url = url_for('main.page_status', page_id=page_id)
     
-    # Get the Shopify settings
-    active_settings = ShopifySettings.query.filter_by(is_active=True).first()
     if not active_settings:
-        flash('Please configure your Shopify API settings first.', 'warning')
-        return redirect(url_for('main.settings'))
+        return publish_reply('error', 'Please configure your Shopify API settings first.', 'warning',
+                             url_for('main.settings'), status_code=400)
+    
+    if page_content.status == 'publishing' and not expire_stalled_task(page_content):
+        return publish_reply('publishing', 'This page is already being published to Shopify.', 'info',
+                             preview_url, status_url)
+    
+    # Skip the Shopify call when nothing changed since the last publish
+    if (page_content.published and
+            tasks.is_unchanged_since_publish('page', page_id, tasks.build_page_data(page_content))):
+        return publish_reply('unchanged', 'No changes since the last publish.', 'info',
+                             preview_url, status_url, status_code=200)
+    
+    # Mark the page as publishing and hand the Shopify call to a background worker
+    page_content.status = 'publishing'
+    page_content.publish_error = None
+    db.session.commit()
+    tasks.submit(tasks.publish_page_task, page_id, active_settings.id)
     
-    try:
-        # Initialize Shopify client
-        shopify_client = ShopifyClient(
-            active_settings.api_key,
-            active_settings.password,
-            active_settings.store_url,
-            active_settings.api_version
-        )
-        
-        # Create page data for Shopify
-        page_data = {
-            'title': page_content.title,
-            'body_html': page_content.content,
-            'published': True,
-            'metafields': [
-                {
-                    'namespace': 'global',
-                    'key': 'title_tag',
-                    'value': page_content.meta_title,
-                    'type': 'single_line_text_field'
-                },
-                {
-                    'namespace': 'global',
-                    'key': 'description_tag',
-                    'value': page_content.meta_description,
-                    'type': 'single_line_text_field'
-                }
-            ]
-        }
-        
-        # Publish to Shopify
-        result = shopify_client.create_page(page_data)
-        
-        # Update the page record with Shopify page ID and published status
-        page_content.shopify_page_id = result.get('id')
-        page_content.published = True
-        page_content.publish_date = datetime.utcnow()
-        db.session.commit()
-        
-        flash('Page successfully published to Shopify!', 'success')
-        return redirect(url_for('main.page_preview', page_id=page_id))
-        
-    except Exception as e:
-        logger.error(f"Error publishing page to Shopify: {str(e)}")
-        flash(f'Error publishing to Shopify: {str(e)}', 'danger')
-        return redirect(url_for('main.page_preview', page_id=page_id))
+    return publish_reply('queued', 'Publishing page to Shopify...', 'info', preview_url, status_url)
+
+@app.route('/page/status/<int:page_id>')
+def page_status(page_id):
+    """API endpoint to poll the generation/publish status of a page"""
+    page_content = db.get_or_404(PageContent, page_id)
+    expire_stalled_task(page_content)
+    return jsonify({
+        'id': page_content.id,
+        'status': page_content.status,
+        'published': page_content.published,
+        'error': page_content.generation_error if page_content.status == 'generation_failed' else page_content.publish_error
+    })
 
 @app.route('/page/regenerate/<int:page_id>')
 def regenerate_page(page_id=None):
     """Route for regenerating a page with different parameters"""
     # If a page ID is provided, store its parameters for pre-filling the form
     if page_id:
-        page = PageContent.query.get_or_404(page_id)
+        if db.session.get(PageContent, page_id, options=[load_only(PageContent.id)]) is None:
+            abort(404)
         # Todo: Store parameters in session for pre-filling the form
     
     # Redirect to the generator page
@@ -1151,10 +1492,10 @@ def regenerate_page(page_id=None):
 def image_caption_generator():
     """Route for the Image Caption Generator form"""
     # Check if AI settings exist in the database
-    active_ai_settings = AISettings.query.filter_by(is_active=True).first()
+    active_ai_settings = get_active_ai_settings()
     
     # Check if Shopify settings exist for Shopify integration options
-    has_shopify_settings = ShopifySettings.query.filter_by(is_active=True).first() is not None
+    has_shopify_settings = get_active_shopify_settings() is not None
     
     form = ImageCaptionGeneratorForm()
     
@@ -1164,65 +1505,33 @@ def image_caption_generator():
             return redirect(url_for('main.ai_settings'))
         
         try:
-            # Create a new batch record
-            batch = ImageBatch(
-                name=form.batch_name.data,
-                source_type=form.source_type.data,
-                source_detail=form.source_detail.data if form.source_detail.data else None,
-                status='pending',
-                export_format=form.export_format.data
-            )
-            
-            # If Shopify is involved, add Shopify settings reference
+            # If Shopify is involved, the active Shopify settings are required
+            shopify_settings = None
             if form.source_type.data == 'shopify' or form.export_format.data == 'shopify_update':
-                shopify_settings = ShopifySettings.query.filter_by(is_active=True).first()
+                shopify_settings = get_active_shopify_settings()
                 if not shopify_settings:
                     flash('Shopify settings are required for this operation.', 'warning')
                     return render_template('image_caption_generator.html', form=form, 
                                           ai_settings=active_ai_settings,
                                           has_shopify_settings=has_shopify_settings)
-                batch.settings_id = shopify_settings.id
-            
-            db.session.add(batch)
-            db.session.commit()
             
-            # Process based on source type
+            # Collect the image items before creating the batch, so invalid
+            # input never writes a batch row
+            image_items = []
             if form.source_type.data == 'url':
                 # Process URL input - can be a single URL or multiple URLs
                 urls = form.source_detail.data.strip().split('\n')
-                urls = [url.strip() for url in urls if url.strip()]
+                image_items = [{'url': url.strip(), 'status': 'pending'} for url in urls if url.strip()]
                 
-                if not urls:
+                if not image_items:
                     flash('Please provide at least one valid URL.', 'warning')
-                    db.session.delete(batch)
-                    db.session.commit()
                     return render_template('image_caption_generator.html', form=form, 
                                           ai_settings=active_ai_settings,
                                           has_shopify_settings=has_shopify_settings)
                 
-                batch.total_count = len(urls)
-                db.session.commit()
-                
-                # Create image items for each URL
-                for url in urls:
-                    image_item = ImageItem(
-                        batch_id=batch.id,
-                        url=url,
-                        status='pending'
-                    )
-                    db.session.add(image_item)
-                
-                db.session.commit()
-                
-            elif form.source_type.data == 'upload':
-                # Process file upload - implemented in separate route
-                session['batch_id'] = batch.id
-                return redirect(url_for('main.upload_images'))
-                
             elif form.source_type.data == 'shopify':
                 # Process Shopify product images
-                shopify_settings = ShopifySettings.query.filter_by(is_active=True).first()
-                shopify_client = ShopifyClient(
+                shopify_client = get_shopify_client(
                     shopify_settings.api_key,
                     shopify_settings.password,
                     shopify_settings.store_url,
@@ -1238,36 +1547,54 @@ def image_caption_generator():
                 
                 if not product_images:
                     flash('No images found in the specified Shopify products.', 'warning')
-                    db.session.delete(batch)
-                    db.session.commit()
                     return render_template('image_caption_generator.html', form=form, 
                                           ai_settings=active_ai_settings,
                                           has_shopify_settings=has_shopify_settings)
                 
-                batch.total_count = len(product_images)
-                db.session.commit()
-                
-                # Create image items for each Shopify image
-                for image in product_images:
-                    image_item = ImageItem(
-                        batch_id=batch.id,
-                        url=image['src'],
-                        shopify_product_id=image['product_id'],
-                        shopify_image_id=image['id'],
-                        status='pending'
-                    )
-                    db.session.add(image_item)
-                
+                image_items = [
+                    {
+                        'url': image['src'],
+                        'shopify_product_id': image['product_id'],
+                        'shopify_image_id': image['id'],
+                        'status': 'pending'
+                    }
+                    for image in product_images
+                ]
+            
+            # Create a new batch record
+            batch = ImageBatch(
+                name=form.batch_name.data,
+                source_type=form.source_type.data,
+                source_detail=form.source_detail.data if form.source_detail.data else None,
+                status='pending',
+                export_format=form.export_format.data,
+                settings_id=shopify_settings.id if shopify_settings else None
+            )
+            db.session.add(batch)
+            db.session.flush()
+            batch_id = batch.id
+            
+            if form.source_type.data == 'upload':
+                # Process file upload - implemented in separate route
                 db.session.commit()
+                session['batch_id'] = batch_id
+                return redirect(url_for('main.upload_images'))
             
-            # Update batch status
+            # Create the image items with one multi-row INSERT; the batch and
+            # its items are saved in a single commit
+            if image_items:
+                for item in image_items:
+                    item['batch_id'] = batch_id
+                db.session.execute(ImageItem.__table__.insert(), image_items)
+                batch.total_count = len(image_items)
             batch.status = 'ready_to_process'
             db.session.commit()
             
             # Redirect to processing page
-            return redirect(url_for('main.process_image_batch', batch_id=batch.id))
+            return redirect(url_for('main.process_image_batch', batch_id=batch_id))
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error setting up image batch: {str(e)}")
             flash(f'Error: {str(e)}', 'danger')
             return render_template('image_caption_generator.html', form=form, 
@@ -1302,25 +1629,26 @@ def upload_images():
         upload_folder = os.path.join(UPLOAD_FOLDER, f'image_batch_{batch_id}')
         os.makedirs(upload_folder, exist_ok=True)
         
-        # Process each uploaded file
-        file_count = 0
+        # Save each uploaded file and collect its image item row
+        image_items = []
         for file in files:
             if file and file.filename:
-                filename = secure_filename(file.filename)
+                filename = safe_filename(file.filename)
                 file_path = os.path.join(upload_folder, filename)
-                file.save(file_path)
-                
-                # Create image item record
-                image_item = ImageItem(
-                    batch_id=batch_id,
-                    filename=filename,
-                    file_path=file_path,
-                    mimetype=file.content_type,
-                    filesize=os.path.getsize(file_path),
-                    status='pending'
-                )
-                db.session.add(image_item)
-                file_count += 1
+                filesize = save_upload(file, file_path)
+                image_items.append({
+                    'batch_id': batch_id,
+                    'filename': filename,
+                    'file_path': file_path,
+                    'mimetype': file.content_type,
+                    'filesize': filesize,
+                    'status': 'pending'
+                })
+        file_count = len(image_items)
+        
+        # Create the image item records with one multi-row INSERT
+        if image_items:
+            db.session.execute(ImageItem.__table__.insert(), image_items)
         
         # Update batch information
         batch.total_count = file_count
@@ -1335,6 +1663,37 @@ def upload_images():
     
     return render_template('image_upload.html', batch=batch)
 
+def expire_stalled_image_batch(batch):
+    """
+    Mark an image batch as failed when the background task captioning it
+    stopped without finishing, e.g. because its worker process restarted,
+    and return its unfinished images to pending so the batch can be run again.
+    
+    Args:
+        batch: ImageBatch
+        
+    Returns:
+        bool: True if the batch was marked as failed
+    """
+    if batch.status != 'processing' or not tasks.is_stale(batch.updated_at):
+        return False
+    
+    result = db.session.execute(update(ImageBatch).where(
+        ImageBatch.id == batch.id,
+        ImageBatch.status == 'processing',
+        ImageBatch.updated_at == batch.updated_at
+    ).values(status='failed'))
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+    
+    db.session.execute(update(ImageItem)
+                       .where(ImageItem.batch_id == batch.id, ImageItem.status == 'processing')
+                       .values(status='pending'))
+    db.session.commit()
+    logger.warning(f"Marked stalled ImageBatch {batch.id} as failed")
+    return True
+
 @app.route('/image-captions/process/<int:batch_id>')
 def process_image_batch(batch_id):
     """Route for processing an image batch"""
@@ -1342,99 +1701,188 @@ def process_image_batch(batch_id):
     batch = ImageBatch.query.get_or_404(batch_id)
     
     # Get AI settings
-    active_ai_settings = AISettings.query.filter_by(is_active=True).first()
+    active_ai_settings = get_active_ai_settings()
     if not active_ai_settings:
         flash('Please configure your AI API settings first.', 'warning')
         return redirect(url_for('main.ai_settings'))
     
-    # Initialize AI service
-    ai_service = AIService(api_key=active_ai_settings.api_key, 
-                         api_provider=active_ai_settings.api_provider)
-    
-    # Get unprocessed images
-    pending_images = ImageItem.query.filter_by(batch_id=batch_id, status='pending').all()
+    # Don't start a second run while the batch is being processed, unless
+    # the run has stalled
+    if batch.status == 'processing' and not expire_stalled_image_batch(batch):
+        return redirect(url_for('main.image_caption_results', batch_id=batch_id))
     
-    if not pending_images:
+    # Check for unprocessed images
+    has_pending = db.session.query(ImageItem.id).filter_by(batch_id=batch_id, status='pending').first()
+    if not has_pending:
         flash('No pending images found in this batch.', 'info')
         return redirect(url_for('main.image_caption_results', batch_id=batch_id))
     
-    # Update batch status
+    # Caption the images in the background and show the progress page
     batch.status = 'processing'
     db.session.commit()
+    tasks.submit(run_image_batch, batch_id, active_ai_settings.id)
+    
+    return redirect(url_for('main.image_caption_results', batch_id=batch_id))
+
+def image_caption_export_query(batch_id):
+    """Build the query streaming a batch's CSV export rows from the database cursor"""
+    return (select(*[getattr(ImageItem, column) for column in IMAGE_CAPTION_EXPORT_COLUMNS])
+            .where(ImageItem.batch_id == batch_id)
+            .order_by(ImageItem.id)
+            .execution_options(yield_per=EXPORT_FETCH_SIZE))
+
+def write_image_caption_export(batch_id, export_path):
+    """
+    Write the CSV export of an image caption batch
+    
+    Args:
+        batch_id (int): ID of the ImageBatch
+        export_path (str): Path of the CSV file to write
+    """
+    # Write to a temporary file first so downloads never see a partial export
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(export_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(IMAGE_CAPTION_EXPORT_COLUMNS)
+            for rows in db.session.execute(image_caption_export_query(batch_id)).partitions():
+                writer.writerows(rows)
+        os.replace(temp_path, export_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+def run_image_batch(batch_id, ai_settings_id):
+    """
+    Caption the pending images of an image batch (background task).
+    
+    Args:
+        batch_id (int): ID of the ImageBatch to process
+        ai_settings_id (int): ID of the AISettings to caption with
+    """
+    batch = db.session.get(ImageBatch, batch_id)
+    pending_images = ImageItem.query.filter_by(batch_id=batch_id, status='pending').all()
     
     try:
-        # Process each image
+        ai_settings = db.session.get(AISettings, ai_settings_id)
+        if not ai_settings:
+            raise ValueError(f"AI settings {ai_settings_id} not found")
+        ai_service = get_ai_service(ai_settings.api_key, ai_settings.api_provider)
+        
+        # Determine each image's source up front, using the local file when
+        # present; the commit below expires the loaded rows
+        jobs = []
+        image_ids = []
         for image in pending_images:
-            # Set image status to processing
-            image.status = 'processing'
-            db.session.commit()
+            image_source = None
+            if image.file_path and os.path.exists(image.file_path):
+                image_source = {'type': 'file', 'path': image.file_path}
+            elif image.url:
+                image_source = {'type': 'url', 'url': image.url}
+            shopify_ids = None
+            if image.shopify_product_id and image.shopify_image_id:
+                shopify_ids = (image.shopify_product_id, image.shopify_image_id)
+            jobs.append((image_source, shopify_ids))
+            image_ids.append(image.id)
+        
+        # Mark all pending images as processing in one statement
+        db.session.execute(update(ImageItem)
+                           .where(ImageItem.batch_id == batch_id, ImageItem.status == 'pending')
+                           .values(status='processing'))
+        db.session.commit()
+        
+        # Shopify client for pushing alt text back, if this batch updates Shopify
+        shopify_client = None
+        if batch.export_format == 'shopify_update':
+            shopify_settings = ShopifySettings.query.get(batch.settings_id)
+            if shopify_settings:
+                shopify_client = get_shopify_client(
+                    shopify_settings.api_key,
+                    shopify_settings.password,
+                    shopify_settings.store_url,
+                    shopify_settings.api_version
+                )
+        
+        def caption_image(job):
+            """Caption one image; runs in a worker thread without DB access"""
+            image_source, _ = job
+            if not image_source:
+                raise ValueError("No valid image source found")
             
+            # Generate captions using AI service
+            return ai_service.generate_image_captions(
+                image_source=image_source,
+                include_alt_text=True,
+                include_seo=True,
+                include_tags=True,
+                include_product_suggestions=True
+            )
+        
+        def run_job(job):
             try:
-                # Determine the image source to use
-                image_source = None
-                if image.file_path and os.path.exists(image.file_path):
-                    # Use local file path
-                    image_source = {'type': 'file', 'path': image.file_path}
-                elif image.url:
-                    # Use URL
-                    image_source = {'type': 'url', 'url': image.url}
-                
-                if not image_source:
-                    raise ValueError("No valid image source found")
-                
-                # Generate captions using AI service
-                caption_data = ai_service.generate_image_captions(
-                    image_source=image_source,
-                    include_alt_text=True,
-                    include_seo=True,
-                    include_tags=True,
-                    include_product_suggestions=True
-                )
-                
-                # Update image with generated captions
-                image.alt_text = caption_data.get('alt_text')
-                image.caption = caption_data.get('caption')
-                image.tags = caption_data.get('tags')
-                image.detailed_description = caption_data.get('detailed_description')
-                image.seo_keywords = caption_data.get('seo_keywords')
-                image.seo_title = caption_data.get('seo_title')
-                image.product_suggested_name = caption_data.get('product_name')
-                image.product_category = caption_data.get('product_category')
-                image.status = 'completed'
-                image.processed_at = datetime.utcnow()
-                
-                # Update batch counter
-                batch.processed_count += 1
-                
-                # If this is a Shopify update and we have Shopify details
-                if batch.export_format == 'shopify_update' and image.shopify_product_id and image.shopify_image_id:
-                    # Get Shopify settings
-                    shopify_settings = ShopifySettings.query.get(batch.settings_id)
-                    if shopify_settings:
-                        # Initialize Shopify client
-                        shopify_client = ShopifyClient(
-                            shopify_settings.api_key,
-                            shopify_settings.password, 
-                            shopify_settings.store_url,
-                            shopify_settings.api_version
-                        )
-                        
-                        # Update image in Shopify
-                        update_result = shopify_client.update_product_image(
-                            product_id=image.shopify_product_id,
-                            image_id=image.shopify_image_id,
-                            alt_text=image.alt_text
-                        )
-                        
-                        if update_result:
-                            image.shopify_updated = True
-                
-                db.session.commit()
+                return caption_image(job), None
+            except Exception as e:
+                return None, e
+        
+        # Alt text to push to Shopify once captioning is done: (product ID, image ID, alt text)
+        shopify_updates = []
+        shopify_image_rows = {}
+        
+        # Caption the images concurrently; the provider calls are I/O bound
+        with ThreadPoolExecutor(max_workers=max(1, min(IMAGE_CAPTION_CONCURRENCY, len(jobs)))) as executor:
+            # Store results as they arrive, committing every IMAGE_BATCH_COMMIT_SIZE images
+            outcomes = executor.map(run_job, jobs)
+            # Images saved in the same commit share one processed_at timestamp
+            processed_at = datetime.utcnow()
+            for i, (image, image_id, job, (outcome, error)) in enumerate(
+                    zip(pending_images, image_ids, jobs, outcomes), 1):
+                if error is not None:
+                    logger.error(f"Error processing image {image_id}: {str(error)}")
+                    image.status = 'failed'
+                    image.error_message = str(error)
+                else:
+                    caption_data = outcome
+                    image.alt_text = caption_data.get('alt_text')
+                    image.caption = caption_data.get('caption')
+                    image.tags = caption_data.get('tags')
+                    image.detailed_description = caption_data.get('detailed_description')
+                    image.seo_keywords = caption_data.get('seo_keywords')
+                    image.seo_title = caption_data.get('seo_title')
+                    image.product_suggested_name = caption_data.get('product_name')
+                    image.product_category = caption_data.get('product_category')
+                    image.status = 'completed'
+                    image.processed_at = processed_at
+                    
+                    shopify_ids = job[1]
+                    if shopify_client and shopify_ids and caption_data.get('alt_text'):
+                        shopify_updates.append((*shopify_ids, caption_data['alt_text']))
+                        shopify_image_rows[str(shopify_ids[1])] = image_id
+                    
+                    # Update batch counter
+                    batch.processed_count += 1
                 
+                if i % IMAGE_BATCH_COMMIT_SIZE == 0:
+                    # Touch the batch even if every image failed, so it is
+                    # not taken for a stalled run
+                    batch.updated_at = datetime.utcnow()
+                    db.session.commit()
+                    processed_at = datetime.utcnow()
+        
+        db.session.commit()
+        
+        # Push the new alt text to Shopify in batched requests and flag the updated images
+        if shopify_updates:
+            try:
+                updated_image_ids = shopify_client.update_product_image_alts(shopify_updates)
             except Exception as e:
-                logger.error(f"Error processing image {image.id}: {str(e)}")
-                image.status = 'failed'
-                image.error_message = str(e)
+                logger.exception(f"Error updating image alt text in Shopify for batch {batch_id}: {str(e)}",
+                                 extra={'batch_id': batch_id})
+                updated_image_ids = set()
+            if updated_image_ids:
+                db.session.execute(update(ImageItem)
+                                   .where(ImageItem.id.in_([shopify_image_rows[image_id]
+                                                            for image_id in updated_image_ids]))
+                                   .values(shopify_updated=True))
                 db.session.commit()
         
         # Update batch status
@@ -1453,37 +1901,55 @@ def process_image_batch(batch_id):
         # If export format is CSV, generate and save the export file
         if batch.export_format == 'csv':
             export_path = os.path.join(UPLOAD_FOLDER, f'image_captions_batch_{batch_id}.csv')
-            # Create a pandas DataFrame from the image items
-            # Include all relevant fields for the CSV export
-            # Save the CSV file
-            # Update the batch with the export path
+            write_image_caption_export(batch_id, export_path)
             batch.export_path = export_path
             db.session.commit()
         
-        return redirect(url_for('main.image_caption_results', batch_id=batch_id))
-        
     except Exception as e:
-        logger.error(f"Error processing batch {batch_id}: {str(e)}")
+        db.session.rollback()
+        logger.exception(f"Error processing batch {batch_id}: {str(e)}", extra={'batch_id': batch_id})
         batch.status = 'failed'
+        # Return the images this run did not finish to pending so the batch can be run again
+        db.session.execute(update(ImageItem)
+                           .where(ImageItem.batch_id == batch_id, ImageItem.status == 'processing')
+                           .values(status='pending'))
         db.session.commit()
-        flash(f'Error processing batch: {str(e)}', 'danger')
-        return redirect(url_for('main.image_caption_generator'))
+
+@app.route('/image-captions/status/<int:batch_id>')
+def image_batch_status(batch_id):
+    """API endpoint to poll the progress of an image caption batch"""
+    batch = db.get_or_404(ImageBatch, batch_id)
+    expire_stalled_image_batch(batch)
+    return jsonify({
+        'id': batch.id,
+        'status': batch.status,
+        'processed_count': batch.processed_count,
+        'total_count': batch.total_count
+    })
 
 @app.route('/image-captions/results/<int:batch_id>')
 def image_caption_results(batch_id):
     """Route for viewing the results of an image caption batch"""
-    # Get the batch record
-    batch = ImageBatch.query.get_or_404(batch_id)
-    
-    # Get the images associated with this batch
-    images = ImageItem.query.filter_by(batch_id=batch_id).all()
-    
-    # Get statistics
+    # Get the batch record with its images loaded by one extra SELECT ... IN
+    # query; any other lazy load from the template raises instead of adding queries
+    query = (select(ImageBatch)
+             .options(selectinload(ImageBatch.images), raiseload('*'))
+             .where(ImageBatch.id == batch_id))
+    batch = db.first_or_404(query)
+    
+    # Stop showing progress for a run that stalled; reload the batch and its
+    # images after they were reset
+    if expire_stalled_image_batch(batch):
+        batch = db.first_or_404(query)
+    images = batch.images
+    
+    # Get statistics from the images already loaded instead of COUNT queries
+    status_counts = Counter(image.status for image in images)
     stats = {
         'total': batch.total_count,
         'processed': batch.processed_count,
-        'success': ImageItem.query.filter_by(batch_id=batch_id, status='completed').count(),
-        'failed': ImageItem.query.filter_by(batch_id=batch_id, status='failed').count()
+        'success': status_counts['completed'],
+        'failed': status_counts['failed']
     }
     
     return render_template('image_caption_results.html', batch=batch, images=images, stats=stats)
@@ -1494,49 +1960,34 @@ def download_image_captions(batch_id):
     # Get the batch record
     batch = ImageBatch.query.get_or_404(batch_id)
     
-    if batch.export_format != 'csv' or not batch.export_path or not os.path.exists(batch.export_path):
-        # If the export hasn't been created yet, generate it on-the-fly
-        images = ImageItem.query.filter_by(batch_id=batch_id).all()
-        
-        # Convert to a list of dictionaries for DataFrame
-        image_data = []
-        for img in images:
-            image_data.append({
-                'filename': img.filename,
-                'url': img.url,
-                'alt_text': img.alt_text,
-                'caption': img.caption,
-                'tags': img.tags,
-                'detailed_description': img.detailed_description,
-                'seo_keywords': img.seo_keywords,
-                'seo_title': img.seo_title,
-                'product_suggested_name': img.product_suggested_name,
-                'product_category': img.product_category,
-                'status': img.status,
-                'shopify_product_id': img.shopify_product_id,
-                'shopify_image_id': img.shopify_image_id,
-                'shopify_updated': img.shopify_updated
-            })
-        
-        # Create a pandas DataFrame
-        import pandas as pd
-        df = pd.DataFrame(image_data)
-        
-        # Create a temporary CSV file
-        export_path = os.path.join(UPLOAD_FOLDER, f'image_captions_batch_{batch_id}.csv')
-        df.to_csv(export_path, index=False)
-        
-        # Update the batch with the export path
-        batch.export_path = export_path
-        db.session.commit()
+    # Send the export file if the batch has one
+    if batch.export_format == 'csv' and batch.export_path and os.path.exists(batch.export_path):
+        return send_file(
+            batch.export_path,
+            mimetype='text/csv',
+            as_attachment=True,
+            download_name=f'image_captions_batch_{batch_id}.csv'
+        )
     
-    # Send the file
-    return send_file(
-        batch.export_path,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'image_captions_batch_{batch_id}.csv'
-    )
+    # Otherwise stream the export straight from the database cursor
+    query = image_caption_export_query(batch_id)
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(IMAGE_CAPTION_EXPORT_COLUMNS)
+        for rows in db.session.execute(query).partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Header only when the batch has no images
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename=image_captions_batch_{batch_id}.csv'
+    })
 
 # =====================================
 # Dropshipping Agent Routes
@@ -1620,26 +2071,73 @@ def api_dropshipping_discover_niches():
 # Store Agent Routes
 # =====================================
 
+def get_store_with_shopify_settings(store_id):
+    """
+    Load a store and its Shopify settings with one outer-joined query
+    
+    Args:
+        store_id (int): ID of the StoreSetup
+        
+    Returns:
+        tuple: The store and its ShopifySettings; either is None when missing
+    """
+    row = (db.session.query(StoreSetup, ShopifySettings)
+           .outerjoin(ShopifySettings, StoreSetup.settings_id == ShopifySettings.id)
+           .filter(StoreSetup.id == store_id)
+           .first())
+    return tuple(row) if row else (None, None)
+
+def build_store_agent(shopify_settings):
+    """
+    Create a store agent using the shared clients for the given Shopify settings
+    and the active AI settings
+    
+    Args:
+        shopify_settings: ShopifySettings row or cached snapshot
+        
+    Returns:
+        StoreAgent: The agent, without an AI service if none is configured
+    """
+    shopify_client = get_shopify_client(
+        shopify_settings.api_key,
+        shopify_settings.password,
+        shopify_settings.store_url,
+        shopify_settings.api_version
+    )
+    
+    ai_settings = get_active_ai_settings()
+    ai_service = None
+    if ai_settings:
+        ai_service = get_ai_service(ai_settings.api_key, ai_settings.api_provider)
+    
+    return StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+
 @app.route('/api/stores', methods=['GET'])
 def api_get_stores():
     """API endpoint for getting all stores"""
+    stores_data = _stores_cache.get('all')
+    if stores_data is not None:
+        return jsonify(stores_data)
+    
     try:
-        # Get all stores from the database
-        stores = StoreSetup.query.all()
+        # Get only the listed columns of all stores, as plain rows
+        stores = db.session.execute(select(
+            StoreSetup.id, StoreSetup.store_name, StoreSetup.store_url, StoreSetup.status,
+            StoreSetup.theme_id, StoreSetup.created_at, StoreSetup.updated_at
+        )).all()
         
         # Convert to list of dictionaries
-        stores_data = []
-        for store in stores:
-            stores_data.append({
-                'id': store.id,
-                'name': store.store_name,
-                'store_url': store.store_url,
-                'status': store.status,
-                'theme_id': store.theme_id,
-                'created_at': store.created_at.isoformat() if store.created_at else None,
-                'updated_at': store.updated_at.isoformat() if store.updated_at else None
-            })
+        stores_data = [{
+            'id': store.id,
+            'name': store.store_name,
+            'store_url': store.store_url,
+            'status': store.status,
+            'theme_id': store.theme_id,
+            'created_at': store.created_at.isoformat() if store.created_at else None,
+            'updated_at': store.updated_at.isoformat() if store.updated_at else None
+        } for store in stores]
         
+        _stores_cache.set('all', stores_data)
         return jsonify(stores_data)
     
     except Exception as e:
@@ -1663,26 +2161,13 @@ def api_store_create():
     if settings_id:
         shopify_settings = ShopifySettings.query.get(settings_id)
     else:
-        shopify_settings = ShopifySettings.query.filter_by(is_active=True).first()
+        shopify_settings = get_active_shopify_settings()
     
     if not shopify_settings:
         return jsonify({'status': 'error', 'error': 'No Shopify settings available'}), 400
     
-    ai_settings = AISettings.query.filter_by(is_active=True).first()
-    
-    # Create the agents
-    shopify_client = ShopifyClient(
-        shopify_settings.api_key,
-        shopify_settings.password,
-        shopify_settings.store_url,
-        shopify_settings.api_version
-    )
-    
-    ai_service = None
-    if ai_settings:
-        ai_service = AIService(api_key=ai_settings.api_key, api_provider=ai_settings.api_provider)
-    
-    store_agent = StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+    # Create the agent with the shared Shopify client and AI service
+    store_agent = build_store_agent(shopify_settings)
     
     # Create the store
     try:
@@ -1691,6 +2176,7 @@ def api_store_create():
             user_id=user_id,
             settings_id=settings_id or shopify_settings.id
         )
+        _stores_cache.clear()
         return jsonify(result)
     except Exception as e:
         logger.error(f"Error in store creation API: {str(e)}")
@@ -1709,31 +2195,16 @@ def api_store_add_products():
     if not store_id:
         return jsonify({'status': 'error', 'error': 'Store ID is required'}), 400
     
-    # Check if store exists
-    store = StoreSetup.query.get(store_id)
+    # Check if store exists, loading its Shopify settings in the same query
+    store, shopify_settings = get_store_with_shopify_settings(store_id)
     if not store:
         return jsonify({'status': 'error', 'error': f'Store with ID {store_id} not found'}), 404
     
-    # Get Shopify and AI settings
-    shopify_settings = ShopifySettings.query.get(store.settings_id)
     if not shopify_settings:
         return jsonify({'status': 'error', 'error': 'No Shopify settings available for this store'}), 400
     
-    ai_settings = AISettings.query.filter_by(is_active=True).first()
-    
-    # Create the agents
-    shopify_client = ShopifyClient(
-        shopify_settings.api_key,
-        shopify_settings.password,
-        shopify_settings.store_url,
-        shopify_settings.api_version
-    )
-    
-    ai_service = None
-    if ai_settings:
-        ai_service = AIService(api_key=ai_settings.api_key, api_provider=ai_settings.api_provider)
-    
-    store_agent = StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+    # Create the agent with the shared Shopify client and AI service
+    store_agent = build_store_agent(shopify_settings)
     
     # Add products
     try:
@@ -1759,31 +2230,16 @@ def api_store_customize_theme():
     if not store_id:
         return jsonify({'status': 'error', 'error': 'Store ID is required'}), 400
     
-    # Check if store exists
-    store = StoreSetup.query.get(store_id)
+    # Check if store exists, loading its Shopify settings in the same query
+    store, shopify_settings = get_store_with_shopify_settings(store_id)
     if not store:
         return jsonify({'status': 'error', 'error': f'Store with ID {store_id} not found'}), 404
     
-    # Get Shopify and AI settings
-    shopify_settings = ShopifySettings.query.get(store.settings_id)
     if not shopify_settings:
         return jsonify({'status': 'error', 'error': 'No Shopify settings available for this store'}), 400
     
-    ai_settings = AISettings.query.filter_by(is_active=True).first()
-    
-    # Create the agents
-    shopify_client = ShopifyClient(
-        shopify_settings.api_key,
-        shopify_settings.password,
-        shopify_settings.store_url,
-        shopify_settings.api_version
-    )
-    
-    ai_service = None
-    if ai_settings:
-        ai_service = AIService(api_key=ai_settings.api_key, api_provider=ai_settings.api_provider)
-    
-    store_agent = StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+    # Create the agent with the shared Shopify client and AI service
+    store_agent = build_store_agent(shopify_settings)
     
     # Customize theme
     try:
@@ -1811,31 +2267,16 @@ def api_store_publish():
     if not store_id:
         return jsonify({'status': 'error', 'error': 'Store ID is required'}), 400
     
-    # Check if store exists
-    store = StoreSetup.query.get(store_id)
+    # Check if store exists, loading its Shopify settings in the same query
+    store, shopify_settings = get_store_with_shopify_settings(store_id)
     if not store:
         return jsonify({'status': 'error', 'error': f'Store with ID {store_id} not found'}), 404
     
-    # Get Shopify and AI settings
-    shopify_settings = ShopifySettings.query.get(store.settings_id)
     if not shopify_settings:
         return jsonify({'status': 'error', 'error': 'No Shopify settings available for this store'}), 400
     
-    ai_settings = AISettings.query.filter_by(is_active=True).first()
-    
-    # Create the agents
-    shopify_client = ShopifyClient(
-        shopify_settings.api_key,
-        shopify_settings.password,
-        shopify_settings.store_url,
-        shopify_settings.api_version
-    )
-    
-    ai_service = None
-    if ai_settings:
-        ai_service = AIService(api_key=ai_settings.api_key, api_provider=ai_settings.api_provider)
-    
-    store_agent = StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+    # Create the agent with the shared Shopify client and AI service
+    store_agent = build_store_agent(shopify_settings)
     
     # Publish content
     results = {}
@@ -1878,26 +2319,13 @@ def api_store_from_dropshipping():
     if settings_id:
         shopify_settings = ShopifySettings.query.get(settings_id)
     else:
-        shopify_settings = ShopifySettings.query.filter_by(is_active=True).first()
+        shopify_settings = get_active_shopify_settings()
     
     if not shopify_settings:
         return jsonify({'status': 'error', 'error': 'No Shopify settings available'}), 400
     
-    ai_settings = AISettings.query.filter_by(is_active=True).first()
-    
-    # Create the agents
-    shopify_client = ShopifyClient(
-        shopify_settings.api_key,
-        shopify_settings.password,
-        shopify_settings.store_url,
-        shopify_settings.api_version
-    )
-    
-    ai_service = None
-    if ai_settings:
-        ai_service = AIService(api_key=ai_settings.api_key, api_provider=ai_settings.api_provider)
-    
-    store_agent = StoreAgent(shopify_client=shopify_client, ai_service=ai_service)
+    # Create the agent with the shared Shopify client and AI service
+    store_agent = build_store_agent(shopify_settings)
     
     # Create the store from dropshipping results
     try:
@@ -1908,6 +2336,7 @@ def api_store_from_dropshipping():
             settings_id=settings_id or shopify_settings.id,
             store_name=store_name
         )
+        _stores_cache.clear()
         return jsonify(result)
     except Exception as e:
         logger.error(f"Error in creating store from dropshipping results API: {str(e)}")
@@ -1917,6 +2346,11 @@ def api_store_from_dropshipping():
 @app.route('/api/agent-task/<int:task_id>', methods=['GET'])
 def api_agent_task_status(task_id):
     """API endpoint to get the status of an agent task"""
+    # The agent UI polls this endpoint; serve repeated polls from a short-lived cache
+    response = _agent_task_status_cache.get(task_id)
+    if response is not None:
+        return jsonify(response)
+    
     task = AgentTask.query.get(task_id)
     
     if not task:
@@ -1942,6 +2376,7 @@ def api_agent_task_status(task_id):
             'id': task.result_id
         }
     
+    _agent_task_status_cache.set(task_id, response)
     return jsonify(response)
 
 # =====================================
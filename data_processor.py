@@ -1,10 +1,105 @@
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 import logging
-import re
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from shopify_client import ShopifyRateLimited
 
 logger = logging.getLogger(__name__)
 
+# Numeric variant columns with the default used for blank or unparseable cells
+NUMERIC_COLUMN_DEFAULTS = {
+    'inventory_quantity': (0, 'int64'),
+    'weight': (0.0, 'float64'),
+}
+
+# Text columns copied into every product payload: (column, payload field,
+# default used when the file has no such column)
+PRODUCT_TEXT_FIELDS = (
+    ('title', 'title', None),
+    ('description', 'body_html', ''),
+    ('vendor', 'vendor', 'Default Vendor'),
+    ('product_type', 'product_type', 'General'),
+    ('tags', 'tags', ''),
+)
+
+# Times a product creation rejected by Shopify's rate limit is sent again
+RATE_LIMIT_RETRIES = 3
+
+# Columns read from uploaded product files; any other column is skipped when parsing
+PRODUCT_COLUMNS = frozenset({
+    'title', 'description', 'vendor', 'product_type', 'tags', 'price', 'sku',
+    'inventory_management', 'inventory_quantity', 'requires_shipping', 'taxable',
+    'weight', 'weight_unit', 'inventory_policy',
+    'meta_title', 'meta_description', 'meta_keywords', 'url_handle', 'category_hierarchy',
+})
+
+# Prefixes of the numbered option and image columns (option1, image_url2, image_alt2, ...)
+PRODUCT_COLUMN_PREFIXES = ('option', 'image_url', 'image_alt')
+
+# Free-text columns parsed as strings so values like SKUs keep leading zeros
+PRODUCT_COLUMN_DTYPES = {
+    col: str for col in (
+        'title', 'description', 'vendor', 'product_type', 'tags', 'sku',
+        'meta_title', 'meta_description', 'meta_keywords', 'url_handle', 'category_hierarchy',
+    )
+}
+
+# Prices given as text: whole numbers or up to two decimal places
+PRICE_PATTERN = r'^\d+(\.\d{1,2})?$'
+
+# URLs with a network location, i.e. what urlparse() reports a netloc for
+URL_PATTERN = r'^(?:[A-Za-z][A-Za-z0-9+.-]*:)?//[^/?#]'
+
+# URL handles: lowercase letters, numbers and hyphens
+URL_HANDLE_PATTERN = r'^[a-z0-9-]+$'
+
+def is_product_column(column):
+    """Return True if the column is used when uploading products"""
+    return column in PRODUCT_COLUMNS or str(column).startswith(PRODUCT_COLUMN_PREFIXES)
+
+def normalize_numeric_columns(df):
+    """
+    Coerce the numeric variant columns of the DataFrame in one vectorized pass
+    
+    Args:
+        df (pandas.DataFrame): The DataFrame with product data
+        
+    Returns:
+        pandas.DataFrame: A DataFrame whose numeric columns hold clean numbers
+    """
+    normalized = {}
+    for col, (default, dtype) in NUMERIC_COLUMN_DEFAULTS.items():
+        if col in df.columns:
+            normalized[col] = pd.to_numeric(df[col], errors='coerce').fillna(default).astype(dtype)
+    return df.assign(**normalized) if normalized else df
+
+def prepare_payload_columns(df):
+    """
+    Convert the fields sent with every product for the whole DataFrame at once
+    
+    Adds a '_<field>' column holding the stripped text of each payload field
+    and '_price' holding the price as text, and fills in the numeric variant
+    columns missing from the file with their defaults.
+    
+    Args:
+        df (pandas.DataFrame): The DataFrame with normalized numeric columns
+        
+    Returns:
+        pandas.DataFrame: The DataFrame with the prepared columns added
+    """
+    prepared = {}
+    for column, field, default in PRODUCT_TEXT_FIELDS:
+        if column in df.columns:
+            prepared[f'_{field}'] = df[column].astype(str).str.strip()
+        elif default is not None:
+            prepared[f'_{field}'] = default
+    if 'price' in df.columns:
+        prepared['_price'] = df['price'].astype(str)
+    for column, (default, _) in NUMERIC_COLUMN_DEFAULTS.items():
+        if column not in df.columns:
+            prepared[column] = default
+    return df.assign(**prepared)
+
 def validate_data(df):
     """
     Validate the data in the DataFrame
@@ -29,21 +124,17 @@ def validate_data(df):
     if df['title'].isnull().any():
         errors.append("Some products are missing titles")
     
-    # Check for valid prices
+    # Check for valid prices: numbers, or text in the price format
     if 'price' in df.columns:
-        invalid_prices = df['price'].apply(
-            lambda x: not (isinstance(x, (int, float)) or 
-                          (isinstance(x, str) and re.match(r'^\d+(\.\d{1,2})?$', x)))
-        )
+        invalid_prices = _invalid_price_mask(df['price'])
         if invalid_prices.any():
             invalid_indices = df.index[invalid_prices].tolist()
             errors.append(f"Invalid prices at rows: {invalid_indices}")
     
     # Check for valid image URLs if present
     if 'image_url' in df.columns:
-        invalid_urls = df['image_url'].apply(
-            lambda x: x is not None and not pd.isna(x) and not bool(urlparse(str(x)).netloc)
-        )
+        image_urls = df['image_url']
+        invalid_urls = image_urls.notna() & ~image_urls.astype(str).str.match(URL_PATTERN)
         if invalid_urls.any():
             invalid_indices = df.index[invalid_urls].tolist()
             errors.append(f"Invalid image URLs at rows: {invalid_indices}")
@@ -52,36 +143,29 @@ def validate_data(df):
     
     # Check meta title length (best practice is 50-60 characters)
     if 'meta_title' in df.columns:
-        long_titles = df['meta_title'].apply(
-            lambda x: x is not None and not pd.isna(x) and len(str(x)) > 70
-        )
+        long_titles = df['meta_title'].notna() & (df['meta_title'].astype(str).str.len() > 70)
         if long_titles.any():
             long_indices = df.index[long_titles].tolist()
             warnings.append(f"Meta titles exceeding 70 characters at rows: {long_indices} (may be truncated in search results)")
     
     # Check meta description length (best practice is 150-160 characters)
     if 'meta_description' in df.columns:
-        long_descriptions = df['meta_description'].apply(
-            lambda x: x is not None and not pd.isna(x) and len(str(x)) > 160
-        )
+        long_descriptions = df['meta_description'].notna() & (df['meta_description'].astype(str).str.len() > 160)
         if long_descriptions.any():
             long_indices = df.index[long_descriptions].tolist()
             warnings.append(f"Meta descriptions exceeding 160 characters at rows: {long_indices} (may be truncated in search results)")
     
     # Validate URL handles format (lowercase, alphanumeric with hyphens)
     if 'url_handle' in df.columns:
-        invalid_handles = df['url_handle'].apply(
-            lambda x: x is not None and not pd.isna(x) and not bool(re.match(r'^[a-z0-9-]+$', str(x)))
-        )
+        invalid_handles = df['url_handle'].notna() & ~df['url_handle'].astype(str).str.match(URL_HANDLE_PATTERN)
         if invalid_handles.any():
             invalid_indices = df.index[invalid_handles].tolist()
             errors.append(f"Invalid URL handles at rows: {invalid_indices} (should contain only lowercase letters, numbers, and hyphens)")
     
     # Validate category_hierarchy format
     if 'category_hierarchy' in df.columns:
-        invalid_categories = df['category_hierarchy'].apply(
-            lambda x: x is not None and not pd.isna(x) and '>' not in str(x)
-        )
+        invalid_categories = (df['category_hierarchy'].notna()
+                              & ~df['category_hierarchy'].astype(str).str.contains('>', regex=False))
         if invalid_categories.any():
             invalid_indices = df.index[invalid_categories].tolist()
             warnings.append(f"Category hierarchies at rows: {invalid_indices} should be formatted as 'Parent > Child > Grandchild'")
@@ -96,161 +180,241 @@ def validate_data(df):
         'errors': errors
     }
 
-def process_data(df, shopify_client):
+def _invalid_price_mask(prices):
+    """
+    Flag the prices that are neither numbers nor text in the price format
+    
+    Args:
+        prices (pandas.Series): The price column
+        
+    Returns:
+        pandas.Series: Boolean mask of the invalid prices
+    """
+    if is_numeric_dtype(prices):
+        return prices.isna()
+    
+    # Mixed columns: text must match the price format, anything else must be a number
+    is_text = prices.map(type).eq(str)
+    well_formed = prices.astype(str).str.match(PRICE_PATTERN)
+    is_number = ~is_text & pd.to_numeric(prices.where(~is_text), errors='coerce').notna()
+    return ~((is_text & well_formed) | is_number)
+
+def process_data(df, shopify_client, concurrency=1):
     """
     Process the data and upload to Shopify
     
     Args:
         df (pandas.DataFrame): The DataFrame with product data
         shopify_client (ShopifyClient): The Shopify API client
+        concurrency (int): Maximum number of products created in parallel
         
     Returns:
         list: Results of the processing with status for each product
     """
     logger.info(f"Processing {len(df)} products")
-    results = []
     
-    # Process each row in the DataFrame
-    for index, row in df.iterrows():
-        try:
-            # Validate required fields
-            if 'title' not in row or pd.isna(row['title']):
-                raise ValueError("Product title is required")
+    # Convert numeric and text columns for the whole frame up front instead of per row
+    df = prepare_payload_columns(normalize_numeric_columns(df))
+    
+    # Find the option and additional image columns, and the names that go
+    # with them, once for all rows: (value column, variant key, name column,
+    # default name) and (image URL column, alt text column or None)
+    option_columns = [(col, f'option{i}', f'option{i}_name', f'Option {i}')
+                      for i, col in enumerate((col for col in df.columns if col.startswith('option')), 1)]
+    image_columns = []
+    for col in df.columns:
+        if col.startswith('image_url') and col != 'image_url':
+            alt_col = col.replace('image_url', 'image_alt')
+            image_columns.append((col, alt_col if alt_col in df.columns else None))
+    
+    # Convert the rows to plain dicts in one pass instead of building a Series per row
+    rows = zip(df.index, df.to_dict('records'))
+    
+    # Process each row, creating products concurrently when allowed; the
+    # Shopify client spaces out the requests it sends
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda item: _process_row(item[0], item[1], option_columns, image_columns, shopify_client),
+                rows))
+    else:
+        results = [_process_row(index, row, option_columns, image_columns, shopify_client)
+                   for index, row in rows]
+    
+    return results
 
-            # Extract basic product information with defaults
-            product_data = {
-                'product': {
-                    'title': str(row['title']).strip(),
-                    'body_html': str(row.get('description', '')).strip(),
-                    'vendor': str(row.get('vendor', 'Default Vendor')).strip(),
-                    'product_type': str(row.get('product_type', 'General')).strip(),
-                    'tags': str(row.get('tags', '')).strip(),
-                    'status': 'active',
-                    'published': True,
-                }
+def _process_row(index, row, option_columns, image_columns, shopify_client):
+    """
+    Build the Shopify payload for a single row and create the product
+    
+    Args:
+        index (int): Index of the row in the DataFrame
+        row (dict): The row with product data, by column name
+        option_columns (list): (column, variant key, name column, default name) of
+            each column starting with 'option'
+        image_columns (list): (URL column, alt text column or None) of each
+            additional image (image_url2, image_url3, ...)
+        shopify_client (ShopifyClient): The Shopify API client
+        
+    Returns:
+        dict: Result of the processing with status for the product
+    """
+    try:
+        # Validate required fields
+        if 'title' not in row or pd.isna(row['title']):
+            raise ValueError("Product title is required")
+        
+        # Extract basic product information with defaults
+        product_data = {
+            'product': {
+                'title': row['_title'],
+                'body_html': row['_body_html'],
+                'vendor': row['_vendor'],
+                'product_type': row['_product_type'],
+                'tags': row['_tags'],
+                'status': 'active',
+                'published': True,
             }
+        }
+        
+        # Add SEO fields if present
+        if 'meta_title' in row and pd.notna(row['meta_title']):
+            product_data['product']['metafields_global_title_tag'] = row['meta_title']
+        
+        if 'meta_description' in row and pd.notna(row['meta_description']):
+            product_data['product']['metafields_global_description_tag'] = row['meta_description']
+        
+        # Handle custom URL handle (slug)
+        if 'url_handle' in row and pd.notna(row['url_handle']):
+            product_data['product']['handle'] = row['url_handle']
+        
+        # Add meta keywords via metafields if available
+        if 'meta_keywords' in row and pd.notna(row['meta_keywords']):
+            if 'metafields' not in product_data['product']:
+                product_data['product']['metafields'] = []
             
-            # Add SEO fields if present
-            if 'meta_title' in row and pd.notna(row['meta_title']):
-                product_data['product']['metafields_global_title_tag'] = row['meta_title']
-            
-            if 'meta_description' in row and pd.notna(row['meta_description']):
-                product_data['product']['metafields_global_description_tag'] = row['meta_description']
+            product_data['product']['metafields'].append({
+                'key': 'keywords',
+                'value': row['meta_keywords'],
+                'namespace': 'global',
+                'value_type': 'string'
+            })
+        
+        # Add hierarchical categorization via collections tags if available
+        if 'category_hierarchy' in row and pd.notna(row['category_hierarchy']):
+            categories = str(row['category_hierarchy']).split('>')
+            categories = [cat.strip() for cat in categories]
             
-            # Handle custom URL handle (slug)
-            if 'url_handle' in row and pd.notna(row['url_handle']):
-                product_data['product']['handle'] = row['url_handle']
+            # Add hierarchical categories to tags for better SEO
+            existing_tags = product_data['product']['tags']
+            hierarchical_tags = ', '.join([f"category:{cat}" for cat in categories])
             
-            # Add meta keywords via metafields if available
-            if 'meta_keywords' in row and pd.notna(row['meta_keywords']):
-                if 'metafields' not in product_data['product']:
-                    product_data['product']['metafields'] = []
-                
-                product_data['product']['metafields'].append({
-                    'key': 'keywords',
-                    'value': row['meta_keywords'],
-                    'namespace': 'global',
-                    'value_type': 'string'
+            if existing_tags:
+                product_data['product']['tags'] = f"{existing_tags}, {hierarchical_tags}"
+            else:
+                product_data['product']['tags'] = hierarchical_tags
+        
+        # Add price as a variant
+        variant = {
+            'price': row['_price'],
+            'sku': row.get('sku', ''),
+            'inventory_management': row.get('inventory_management', 'shopify'),
+            'inventory_quantity': row['inventory_quantity'],
+            'requires_shipping': row.get('requires_shipping', True),
+            'taxable': row.get('taxable', True),
+            'weight': row['weight'],
+            'weight_unit': row.get('weight_unit', 'kg'),
+            'inventory_policy': row.get('inventory_policy', 'deny'),
+        }
+        
+        # Handle options and variants
+        options = []
+        
+        for option_col, variant_key, name_col, default_name in option_columns:
+            option_value = row[option_col]
+            if pd.notna(option_value):
+                options.append({
+                    'name': row.get(name_col, default_name),
+                    'values': [option_value]
                 })
+                variant[variant_key] = option_value
+        
+        if options:
+            product_data['product']['options'] = options
+        
+        # Add the variant to the product
+        product_data['product']['variants'] = [variant]
+        
+        # Add images if present
+        if 'image_url' in row and pd.notna(row['image_url']):
+            product_data['product']['images'] = [{
+                'src': row['image_url']
+            }]
             
-            # Add hierarchical categorization via collections tags if available
-            if 'category_hierarchy' in row and pd.notna(row['category_hierarchy']):
-                categories = str(row['category_hierarchy']).split('>')
-                categories = [cat.strip() for cat in categories]
-                
-                # Add hierarchical categories to tags for better SEO
-                existing_tags = product_data['product']['tags']
-                hierarchical_tags = ', '.join([f"category:{cat}" for cat in categories])
+            # Add alt text for the image if available (good for SEO)
+            if 'image_alt' in row and pd.notna(row['image_alt']):
+                product_data['product']['images'][0]['alt'] = row['image_alt']
+        
+        # Additional image URLs (image_url2, image_url3, etc.)
+        additional_images = []
+        for col, alt_col in image_columns:
+            if pd.notna(row[col]):
+                image_data = {'src': row[col]}
                 
-                if existing_tags:
-                    product_data['product']['tags'] = f"{existing_tags}, {hierarchical_tags}"
-                else:
-                    product_data['product']['tags'] = hierarchical_tags
-            
-            # Add price as a variant
-            variant = {
-                'price': str(row['price']),
-                'sku': row.get('sku', ''),
-                'inventory_management': row.get('inventory_management', 'shopify'),
-                'inventory_quantity': int(row.get('inventory_quantity', 0)),
-                'requires_shipping': row.get('requires_shipping', True),
-                'taxable': row.get('taxable', True),
-                'weight': float(row.get('weight', 0)),
-                'weight_unit': row.get('weight_unit', 'kg'),
-                'inventory_policy': row.get('inventory_policy', 'deny'),
-            }
-            
-            # Handle options and variants
-            options = []
-            option_columns = [col for col in df.columns if col.startswith('option')]
-            
-            if option_columns:
-                for i, option_col in enumerate(option_columns, 1):
-                    option_name = row.get(f'option{i}_name', f'Option {i}')
-                    option_value = row.get(option_col)
-                    if pd.notna(option_value):
-                        options.append({
-                            'name': option_name,
-                            'values': [option_value]
-                        })
-                        variant[f'option{i}'] = option_value
-            
-            if options:
-                product_data['product']['options'] = options
-            
-            # Add the variant to the product
-            product_data['product']['variants'] = [variant]
-            
-            # Add images if present
-            if 'image_url' in row and pd.notna(row['image_url']):
-                product_data['product']['images'] = [{
-                    'src': row['image_url']
-                }]
+                # Add alt text for additional images if available
+                if alt_col and pd.notna(row[alt_col]):
+                    image_data['alt'] = row[alt_col]
                 
-                # Add alt text for the image if available (good for SEO)
-                if 'image_alt' in row and pd.notna(row['image_alt']):
-                    product_data['product']['images'][0]['alt'] = row['image_alt']
-            
-            # Additional image URLs (image_url2, image_url3, etc.)
-            additional_images = []
-            for col in df.columns:
-                if col.startswith('image_url') and col != 'image_url' and pd.notna(row[col]):
-                    image_data = {'src': row[col]}
-                    
-                    # Add alt text for additional images if available
-                    alt_col = col.replace('image_url', 'image_alt')
-                    if alt_col in row and pd.notna(row[alt_col]):
-                        image_data['alt'] = row[alt_col]
-                        
-                    additional_images.append(image_data)
-            
-            if additional_images:
-                if 'images' not in product_data['product']:
-                    product_data['product']['images'] = []
-                product_data['product']['images'].extend(additional_images)
-            
-            # Create the product in Shopify
-            logger.debug(f"Creating product: {product_data}")
-            response = shopify_client.create_product(product_data)
-            
-            # Add the result
-            product_id = response['product']['id']
-            product_title = response['product']['title']
-            results.append({
-                'row': index + 2,  # +2 to account for 0-indexing and header row
-                'title': product_title,
-                'id': product_id,
-                'status': 'success',
-                'message': f"Created product {product_title} with ID {product_id}"
-            })
-            
-        except Exception as e:
-            logger.error(f"Error processing row {index}: {str(e)}")
-            results.append({
-                'row': index + 2,
-                'title': row.get('title', 'Unknown'),
-                'status': 'error',
-                'message': str(e)
-            })
+                additional_images.append(image_data)
+        
+        if additional_images:
+            if 'images' not in product_data['product']:
+                product_data['product']['images'] = []
+            product_data['product']['images'].extend(additional_images)
+        
+        # Create the product in Shopify
+        logger.debug(f"Creating product: {product_data}")
+        response = _create_product(shopify_client, product_data)
+        
+        # Add the result
+        product_id = response['product']['id']
+        product_title = response['product']['title']
+        return {
+            'row': index + 2,  # +2 to account for 0-indexing and header row
+            'title': product_title,
+            'id': product_id,
+            'status': 'success',
+            'message': f"Created product {product_title} with ID {product_id}"
+        }
     
-    return results
+    except Exception as e:
+        logger.error(f"Error processing row {index}: {str(e)}")
+        return {
+            'row': index + 2,
+            'title': row.get('title', 'Unknown'),
+            'status': 'error',
+            'message': str(e)
+        }
+
+def _create_product(shopify_client, product_data):
+    """
+    Create a product, sending it again when Shopify rate limits the request
+    
+    A rate-limited request was not processed, so resending it can't create a
+    duplicate. The client itself holds back every request, from all threads,
+    until the wait Shopify asked for has passed.
+    
+    Args:
+        shopify_client (ShopifyClient): The Shopify API client
+        product_data (dict): Product payload
+        
+    Returns:
+        dict: Response from the Shopify API
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return shopify_client.create_product(product_data)
+        except ShopifyRateLimited as e:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            logger.warning(f"Rate limited creating a product, retrying after {e.retry_after}s")
@@ -2,6 +2,7 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from main import app
+from models import UTC_NOW_SQL
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -49,6 +50,110 @@ def alter_shopify_settings_table():
         logger.error(f"Error during migration: {e}")
         return False
 
+# Columns added after their tables were first created: (table, column, definition)
+NEW_COLUMNS = [
+    ('blog_post', 'publish_error', 'TEXT'),
+    ('page_content', 'status', "VARCHAR(50) DEFAULT 'ready'"),
+    ('page_content', 'publish_error', 'TEXT'),
+    ('blog_post', 'generation_error', 'TEXT'),
+    ('blog_post', 'generation_stats', 'JSON'),
+    ('page_content', 'generation_error', 'TEXT'),
+    ('upload_history', 'status', "VARCHAR(50) DEFAULT 'completed'"),
+    ('upload_history', 'error_message', 'TEXT'),
+]
+
+# Statements filling in new columns from existing data. They only touch rows
+# still holding the column's default, so running them again is harmless
+COLUMN_BACKFILLS = [
+    # Pages published before status existed would otherwise look like unpublished drafts
+    "UPDATE page_content SET status = 'published' WHERE published AND status = 'ready'",
+]
+
+def add_new_columns():
+    """Add columns missing from existing tables"""
+    from sqlalchemy import text
+    from app import db
+    
+    try:
+        with db.engine.connect() as conn:
+            for table, column, definition in NEW_COLUMNS:
+                result = conn.execute(text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_name=:table AND column_name=:column"
+                ), {'table': table, 'column': column})
+                if result.rowcount == 0:
+                    logger.info(f"Adding {column} column to {table} table")
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+                    conn.commit()
+                else:
+                    logger.info(f"{column} column already exists in {table}")
+            for statement in COLUMN_BACKFILLS:
+                conn.execute(text(statement))
+            conn.commit()
+        logger.info("Column migration completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error during column migration: {e}")
+        return False
+
+# Indexes added after their tables were first created; db.create_all() only
+# creates indexes together with new tables
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_upload_history_upload_date_desc "
+    "ON upload_history (upload_date DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_shopify_settings_active "
+    "ON shopify_settings (is_active) WHERE is_active",
+    "CREATE INDEX IF NOT EXISTS ix_ai_settings_active "
+    "ON ai_settings (is_active) WHERE is_active",
+    "CREATE INDEX IF NOT EXISTS ix_blog_post_shopify_post_id "
+    "ON blog_post (shopify_post_id)",
+    "CREATE INDEX IF NOT EXISTS ix_page_content_shopify_page_id "
+    "ON page_content (shopify_page_id)",
+    "CREATE INDEX IF NOT EXISTS ix_image_item_batch_status "
+    "ON image_item (batch_id, status)",
+]
+
+def create_indexes():
+    """Create indexes missing from existing tables"""
+    from sqlalchemy import text
+    from app import db
+    
+    try:
+        with db.engine.connect() as conn:
+            for statement in INDEX_STATEMENTS:
+                conn.execute(text(statement))
+            conn.commit()
+        logger.info("Index migration completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error during index migration: {e}")
+        return False
+
+# Column defaults moved from Python to the database: (table, column, default)
+COLUMN_DEFAULTS = [
+    ('shopify_settings', 'last_used_at', UTC_NOW_SQL),
+    ('ai_settings', 'last_used_at', UTC_NOW_SQL),
+]
+
+def set_column_defaults():
+    """Set server-side defaults on columns of existing tables"""
+    from sqlalchemy import text
+    from app import db
+    
+    try:
+        with db.engine.connect() as conn:
+            for table, column, default in COLUMN_DEFAULTS:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default}"))
+            conn.commit()
+        logger.info("Column default migration completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error during column default migration: {e}")
+        return False
+
 if __name__ == '__main__':
     with app.app_context():
-        alter_shopify_settings_table()
\ No newline at end of file
+        alter_shopify_settings_table()
+        add_new_columns()
+        create_indexes()
+        set_column_defaults()
\ No newline at end of file
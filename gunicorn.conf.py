@@ -0,0 +1,18 @@
+import os
+
+# Gunicorn loads this file from the working directory on startup.
+
+# Requests spend most of their time waiting on the AI providers and Shopify,
+# so a worker process serves several of them at once on threads instead of
+# blocking the only sync worker. Scale with threads rather than workers: the
+# settings and stats caches live in each process and are only invalidated in
+# the process that saved a change, and every worker opens its own database
+# pool as sized in main.py. Keep threads plus the background task pool within
+# that pool size.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 12))
+
+# AI generation requests can take well over the default 30 seconds
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
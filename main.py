@@ -1,12 +1,42 @@
 import os
+import time
 
-from flask import Flask
+from flask import Flask, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to Flask's default JSON provider
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        # Datetimes are passed through so they keep Flask's HTTP date format
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        # orjson has no object_hook; the session serializer needs it to untag values
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 # Create a Flask app
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 # Configure flask app
 app.secret_key = os.environ.get("SESSION_SECRET", "shopify-product-uploader-secret")
@@ -17,9 +47,17 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    # Room for request threads plus background tasks; fail fast instead of queueing
+    "pool_size": 20,
+    "max_overflow": 10,
+    "pool_timeout": 5,
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Internal nginx location serving the temp folder (e.g. /protected/); when set,
+# generated CSV downloads are handed to nginx with X-Accel-Redirect
+app.config["X_ACCEL_REDIRECT_PREFIX"] = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
+
 # Import models and initialize database
 from models import db, ShopifySettings, UploadHistory, ProductUploadResult, AISettings, BlogPost, PageContent
 
@@ -30,6 +68,38 @@ db.init_app(app)
 with app.app_context():
     db.create_all()
 
+# Development aid: when set, statements running longer than this many seconds
+# are logged. Off by default, so production pays for no timing listeners
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 0))
+if SLOW_QUERY_SECONDS:
+    with app.app_context():
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+        @event.listens_for(db.engine, "after_cursor_execute")
+        def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+            if elapsed > SLOW_QUERY_SECONDS:
+                app.logger.warning(f"Slow query ({elapsed:.3f}s): {statement}")
+
+# Development aid: when set, requests that run more SQL statements than this
+# are logged, so N+1 query patterns creeping into routes or templates show up
+# in the logs. Off by default
+SQL_QUERY_WARN_THRESHOLD = int(os.environ.get("SQL_QUERY_WARN_THRESHOLD", 0))
+if SQL_QUERY_WARN_THRESHOLD:
+    with app.app_context():
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_request_query(conn, cursor, statement, parameters, context, executemany):
+            if has_request_context():
+                g.query_count = g.get("query_count", 0) + 1
+
+    @app.teardown_request
+    def warn_on_query_count(exc):
+        query_count = g.get("query_count", 0)
+        if query_count > SQL_QUERY_WARN_THRESHOLD:
+            app.logger.warning(f"{request.method} {request.path} ran {query_count} SQL queries")
+
 # Import the application routes
 import app as application_routes
 
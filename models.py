@@ -1,11 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy import Float, Text, JSON
+from sqlalchemy import Float, Text, JSON, func, text
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 
+# Current UTC time computed by the database, matching the naive UTC datetimes
+# stored by datetime.utcnow defaults
+UTC_NOW_SQL = "timezone('utc', now())"
+
 class ShopifySettings(db.Model):
     """Model for Shopify API settings"""
     id = db.Column(db.Integer, primary_key=True)
@@ -17,7 +21,12 @@ class ShopifySettings(db.Model):
     is_valid = db.Column(db.Boolean, default=False)  # Whether API credentials are valid
     shop_name = db.Column(db.String(255), nullable=True)  # Store name from Shopify API
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, server_default=text(UTC_NOW_SQL), onupdate=func.timezone('utc', func.now()))
+
+    # Partial index for looking up the active settings row
+    __table_args__ = (
+        db.Index('ix_shopify_settings_active', is_active, postgresql_where=is_active.is_(True)),
+    )
 
     def __repr__(self):
         return f'<ShopifySettings {self.store_url}>'
@@ -29,7 +38,12 @@ class AISettings(db.Model):
     api_key = db.Column(db.String(255), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, server_default=text(UTC_NOW_SQL), onupdate=func.timezone('utc', func.now()))
+
+    # Partial index for looking up the active settings row
+    __table_args__ = (
+        db.Index('ix_ai_settings_active', is_active, postgresql_where=is_active.is_(True)),
+    )
 
     def __repr__(self):
         return f'<AISettings {self.api_provider}>'
@@ -43,11 +57,18 @@ class UploadHistory(db.Model):
     success_count = db.Column(db.Integer, default=0)
     error_count = db.Column(db.Integer, default=0)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(50), default='completed')  # pending, processing, completed, failed
+    error_message = db.Column(db.Text, nullable=True)  # Error that stopped a background upload
     settings_id = db.Column(db.Integer, db.ForeignKey('shopify_settings.id'), nullable=True)
     
     # Relationship with ShopifySettings
     settings = db.relationship('ShopifySettings', backref=db.backref('uploads', lazy=True))
     
+    # Newest-first index for the dashboard's recent uploads list
+    __table_args__ = (
+        db.Index('ix_upload_history_upload_date_desc', upload_date.desc()),
+    )
+    
     def __repr__(self):
         return f'<UploadHistory {self.filename} - {self.upload_date}>'
 
@@ -88,7 +109,10 @@ class BlogPost(db.Model):
     publish_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    status = db.Column(db.String(50), default='draft')  # draft, published, scheduled
+    status = db.Column(db.String(50), default='draft')  # generating, generation_failed, draft, publishing, published, publish_failed, scheduled
+    publish_error = db.Column(db.Text, nullable=True)  # Error from the last failed publish
+    generation_error = db.Column(db.Text, nullable=True)  # Error from a failed background generation
+    generation_stats = db.Column(JSON, nullable=True)  # Word count, reading time, etc. from the last generation
     
     # SEO and categorization
     meta_title = db.Column(db.String(255), nullable=True)
@@ -113,6 +137,10 @@ class BlogPost(db.Model):
     # Relationship with ShopifySettings
     settings = db.relationship('ShopifySettings', backref=db.backref('blog_posts', lazy=True))
     
+    __table_args__ = (
+        db.Index('ix_blog_post_shopify_post_id', shopify_post_id),
+    )
+    
     def __repr__(self):
         return f'<BlogPost {self.title} - {self.status}>'
 
@@ -130,6 +158,9 @@ class PageContent(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     published = db.Column(db.Boolean, default=False)
     publish_date = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(50), default='ready')  # generating, generation_failed, ready, publishing, published, publish_failed
+    publish_error = db.Column(db.Text, nullable=True)  # Error from the last failed publish
+    generation_error = db.Column(db.Text, nullable=True)  # Error from a failed background generation
     
     # SEO fields
     meta_title = db.Column(db.String(255), nullable=True)
@@ -169,6 +200,10 @@ class PageContent(db.Model):
     
     settings = db.relationship('ShopifySettings', backref=db.backref('pages', lazy=True))
     
+    __table_args__ = (
+        db.Index('ix_page_content_shopify_page_id', shopify_page_id),
+    )
+    
     def __repr__(self):
         return f'<PageContent {self.title} - {self.page_type}>'
 
@@ -242,6 +277,11 @@ class ImageItem(db.Model):
     # Relationship with ImageBatch
     batch = db.relationship('ImageBatch', backref=db.backref('images', lazy=True))
     
+    # Serves both lookups by batch and lookups by batch and status
+    __table_args__ = (
+        db.Index('ix_image_item_batch_status', batch_id, status),
+    )
+    
     def __repr__(self):
         return f'<ImageItem {self.filename or self.url[:30]}>'
 
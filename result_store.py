@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Directory holding stored payloads, shared by all worker processes
+STORE_FOLDER = os.path.join('/tmp', 'result_store')
+
+# Default number of seconds a stored payload stays available
+DEFAULT_TTL = 3600
+
+# Minimum number of seconds between sweeps for expired payloads that were never loaded again
+PURGE_INTERVAL = 600
+
+_last_purge = 0.0
+
+
+def _entry_path(key):
+    return os.path.join(STORE_FOLDER, f'{key}.json')
+
+
+def _dumps(entry):
+    """Encode an entry as JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(entry, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(entry, default=str).encode('utf-8')
+
+
+def _loads(data):
+    """Decode JSON bytes written by _dumps()"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def save(payload, ttl=DEFAULT_TTL):
+    """
+    Store a JSON-serializable payload server-side
+
+    Args:
+        payload (dict): Data to store; values that are not JSON types are stored as strings
+        ttl (int): Number of seconds the payload stays available
+
+    Returns:
+        str: Key to keep in the session and pass to load()
+    """
+    os.makedirs(STORE_FOLDER, exist_ok=True)
+    key = uuid.uuid4().hex
+    entry = {'expires_at': time.time() + ttl, 'payload': payload}
+
+    # Write to a temporary file first so readers never see a partial entry
+    fd, temp_path = tempfile.mkstemp(dir=STORE_FOLDER, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(_dumps(entry))
+    # The file's mtime holds its expiry time, so sweeps only need to stat files
+    os.utime(temp_path, (entry['expires_at'], entry['expires_at']))
+    os.replace(temp_path, _entry_path(key))
+
+    purge_expired()
+    return key
+
+
+def load(key):
+    """
+    Load a stored payload
+
+    Args:
+        key (str): Key returned by save()
+
+    Returns:
+        dict: The stored payload, or None if it is missing or expired
+    """
+    if not key:
+        return None
+    try:
+        with open(_entry_path(key), 'rb') as f:
+            entry = _loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load stored payload {key}: {str(e)}")
+        return None
+
+    if entry.get('expires_at', 0) < time.time():
+        delete(key)
+        return None
+    return entry.get('payload')
+
+
+def delete(key):
+    """
+    Delete a stored payload if it exists
+
+    Args:
+        key (str): Key returned by save()
+    """
+    if not key:
+        return
+    try:
+        os.remove(_entry_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired(force=False):
+    """
+    Delete stored payloads that expired without being loaded again
+
+    Runs at most once every PURGE_INTERVAL seconds per process unless forced.
+
+    Args:
+        force (bool): Sweep even if the last sweep was recent
+    """
+    global _last_purge
+    now = time.time()
+    if not force and now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+
+    try:
+        entries = list(os.scandir(STORE_FOLDER))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith('.json') and entry.stat().st_mtime < now:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
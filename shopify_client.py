@@ -1,15 +1,156 @@
 import requests
+import threading
 import time
 import logging
 from base64 import b64encode
+from functools import lru_cache
 from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+    import json
 
 logger = logging.getLogger(__name__)
 
 
+def _encode_json(data):
+    """Serialize a request payload to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data).encode('utf-8')
+
+# Article mutations for the GraphQL Admin API; each saves the article body,
+# SEO metafields and image in a single request
+ARTICLE_CREATE_MUTATION = """
+mutation articleCreate($article: ArticleCreateInput!) {
+  articleCreate(article: $article) {
+    article { id }
+    userErrors { field message }
+  }
+}
+"""
+
+ARTICLE_UPDATE_MUTATION = """
+mutation articleUpdate($id: ID!, $article: ArticleUpdateInput!) {
+  articleUpdate(id: $id, article: $article) {
+    article { id }
+    userErrors { field message }
+  }
+}
+"""
+
+
+FILE_CREATE_MUTATION = """
+mutation fileCreate($files: [FileCreateInput!]!) {
+  fileCreate(files: $files) {
+    files { id fileStatus }
+    userErrors { field message }
+  }
+}
+"""
+
+FILE_IMAGE_QUERY = """
+query fileImage($id: ID!) {
+  node(id: $id) {
+    ... on MediaImage {
+      fileStatus
+      image { url }
+    }
+  }
+}
+"""
+
+# Maximum number of product image updates sent as aliased fields of one mutation
+PRODUCT_IMAGE_UPDATE_BATCH_SIZE = 25
+
+
+def _product_image_update_mutation(count):
+    """Build a mutation that updates count product images, one aliased field each"""
+    params = ', '.join(f'$product{i}: ID!, $image{i}: ImageInput!' for i in range(count))
+    fields = '\n'.join(
+        f'  update{i}: productImageUpdate(productId: $product{i}, image: $image{i}) '
+        f'{{ image {{ id }} userErrors {{ field message }} }}'
+        for i in range(count))
+    return f'mutation productImageUpdates({params}) {{\n{fields}\n}}'
+
+
+# Status codes Shopify uses when a shop's request bucket is exhausted
+RATE_LIMIT_STATUS_CODES = (429, 430)
+
+# Free slots to keep in the REST leaky bucket before pausing new requests
+RATE_LIMIT_HEADROOM = 5
+
+# Requests per second that drain from the REST leaky bucket
+RATE_LIMIT_LEAK_RATE = 2.0
+
+
+class ShopifyGraphQLError(Exception):
+    """Raised when the GraphQL Admin API rejects a query"""
+
+
+class ShopifyRateLimited(requests.exceptions.HTTPError):
+    """Raised when Shopify rejects a request because of rate limiting"""
+
+    def __init__(self, retry_after, *args, **kwargs):
+        """
+        Initialize the error
+
+        Args:
+            retry_after (float): Seconds Shopify asked to wait before retrying
+        """
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+def _create_session():
+    """
+    Create the HTTP session shared by all Shopify clients
+
+    The pooled adapter keeps TLS connections to the shops open between
+    requests. Idempotent requests are retried on connection errors and on
+    server errors; POST requests are never retried here. Rate limiting is
+    left to the caller, which waits as long as Shopify's Retry-After asks.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=50,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    return session
+
+
+@lru_cache(maxsize=8)
+def get_shopify_client(api_key, password, store_url, api_version):
+    """
+    Get a shared Shopify client for a set of credentials
+
+    Reusing the client keeps its rate limiting shared between requests to
+    the same shop.
+
+    Args:
+        api_key (str): Shopify API key
+        password (str): Shopify API password or access token
+        store_url (str): Shopify store URL (e.g., mystore.myshopify.com)
+        api_version (str): Shopify API version (e.g., 2023-07)
+
+    Returns:
+        ShopifyClient: The client for these credentials
+    """
+    return ShopifyClient(api_key, password, store_url, api_version)
+
+
 class ShopifyClient:
     """Client for interacting with the Shopify API"""
 
+    # Connection-pooled session shared by all clients
+    _session = _create_session()
+
     def __init__(self, api_key, password, store_url, api_version):
         """
         Initialize the Shopify API client
@@ -37,9 +178,12 @@ class ShopifyClient:
             'Accept': 'application/json'
         }
 
-        # For rate limiting
+        # For rate limiting; the lock lets several threads share one client
+        # while request starts stay rate_limit_delay apart
         self.last_request_time = 0
         self.rate_limit_delay = 0.5  # 500ms between requests to avoid rate limiting
+        self.blocked_until = 0  # No request starts before this time (rate limit backoff)
+        self._rate_limit_lock = threading.Lock()
 
     def _make_request(self, method, endpoint, data=None):
         """
@@ -54,19 +198,23 @@ class ShopifyClient:
             dict: Response data
         """
         # Rate limiting
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.rate_limit_delay:
-            time.sleep(self.rate_limit_delay - elapsed)
+        with self._rate_limit_lock:
+            wait = max(self.blocked_until - time.time(),
+                       self.rate_limit_delay - (time.time() - self.last_request_time))
+            if wait > 0:
+                time.sleep(wait)
+            self.last_request_time = time.time()
 
         url = urljoin(self.base_url, endpoint)
         logger.debug(f"Making {method} request to {url}")
 
         try:
-            response = requests.request(method=method,
-                                        url=url,
-                                        headers=self.headers,
-                                        json=data)
-            self.last_request_time = time.time()
+            # Serialize the payload once to bytes; large article and page
+            # bodies are much faster to encode with orjson
+            response = self._session.request(method=method,
+                                             url=url,
+                                             headers=self.headers,
+                                             data=_encode_json(data) if data is not None else None)
 
             # Check for rate limiting headers
             if 'X-Shopify-Shop-Api-Call-Limit' in response.headers:
@@ -75,6 +223,16 @@ class ShopifyClient:
                 current, limit = map(int, limit_header.split('/'))
                 if current > limit * 0.8:  # If we're using more than 80% of our limit
                     self.rate_limit_delay = 1.0  # Increase delay
+                if current > limit - RATE_LIMIT_HEADROOM:
+                    # Pause new requests until the bucket has drained below the headroom
+                    self._block_for((current - (limit - RATE_LIMIT_HEADROOM)) / RATE_LIMIT_LEAK_RATE)
+
+            if response.status_code in RATE_LIMIT_STATUS_CODES:
+                retry_after = float(response.headers.get('Retry-After', 2.0))
+                self._block_for(retry_after)
+                raise ShopifyRateLimited(retry_after,
+                                         f"Rate limited by Shopify, retry after {retry_after}s",
+                                         response=response)
 
             response.raise_for_status()
             return response.json()
@@ -86,6 +244,11 @@ class ShopifyClient:
                 logger.error(f"Response body: {e.response.text}")
             raise
 
+    def _block_for(self, seconds):
+        """Hold back all requests from this client for the given number of seconds"""
+        with self._rate_limit_lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
     def test_connection(self):
         """Test the connection to the Shopify API"""
         try:
@@ -265,6 +428,109 @@ class ShopifyClient:
         return self._make_request(
             'DELETE', f'blogs/{blog_id}/articles/{article_id}.json')
 
+    def graphql(self, query, variables=None):
+        """
+        Run a query or mutation against the GraphQL Admin API
+        
+        Args:
+            query (str): GraphQL query or mutation
+            variables (dict, optional): Variables for the query
+            
+        Returns:
+            dict: The 'data' part of the response
+        """
+        response = self._make_request('POST', '',
+                                      data={'query': query, 'variables': variables or {}})
+        if response.get('errors'):
+            raise ShopifyGraphQLError(str(response['errors']))
+        return response.get('data') or {}
+
+    def save_article(self, blog_id, article_data, article_id=None):
+        """
+        Create or update an article with its metafields and image in one GraphQL mutation
+        
+        Falls back to the REST endpoints when the store's API version doesn't
+        support the article mutations.
+        
+        Args:
+            blog_id (str): ID of the blog
+            article_data (dict): Article data in Shopify REST API format
+            article_id (str, optional): ID of the article to update
+            
+        Returns:
+            dict: Response in REST format, with the article ID under 'article'
+        """
+        article = article_data['article']
+        article_input = {
+            'title': article.get('title'),
+            'author': {'name': article.get('author')},
+            'body': article.get('body_html'),
+            'summary': article.get('summary_html'),
+            'tags': [tag.strip() for tag in (article.get('tags') or '').split(',') if tag.strip()],
+            'isPublished': article.get('published', True),
+            'metafields': article.get('metafields', [])
+        }
+        if article.get('handle'):
+            article_input['handle'] = article['handle']
+        if article.get('published_at'):
+            article_input['publishDate'] = article['published_at']
+        if article.get('image'):
+            article_input['image'] = {'url': article['image']['src']}
+        
+        try:
+            if article_id:
+                result = self.graphql(ARTICLE_UPDATE_MUTATION, {
+                    'id': f'gid://shopify/Article/{article_id}',
+                    'article': article_input
+                })['articleUpdate']
+            else:
+                article_input['blogId'] = f'gid://shopify/Blog/{blog_id}'
+                result = self.graphql(ARTICLE_CREATE_MUTATION, {'article': article_input})['articleCreate']
+        except ShopifyGraphQLError as e:
+            logger.warning(f"GraphQL article mutation failed, falling back to REST: {str(e)}")
+            if article_id:
+                return self.update_article(blog_id, article_id, article_data)
+            return self.create_article(blog_id, article_data)
+        
+        if result.get('userErrors'):
+            raise Exception(f"Shopify rejected the article: {result['userErrors']}")
+        
+        # Article IDs come back as gid://shopify/Article/<id>
+        return {'article': {'id': result['article']['id'].rsplit('/', 1)[-1]}}
+
+    def files_create_from_url(self, url, alt=None, timeout=10, poll_interval=1):
+        """
+        Upload an image to Shopify Files from an external URL
+        
+        Shopify fetches and processes the image asynchronously, so the file is
+        polled until its CDN URL is available or the timeout runs out.
+        
+        Args:
+            url (str): External URL of the image
+            alt (str, optional): Alt text for the image
+            timeout (float): Seconds to wait for Shopify to process the image
+            poll_interval (float): Seconds between status checks
+            
+        Returns:
+            str: The Shopify CDN URL of the image, or None if it isn't ready in time
+        """
+        result = self.graphql(FILE_CREATE_MUTATION, {
+            'files': [{'originalSource': url, 'contentType': 'IMAGE', 'alt': alt or ''}]
+        })['fileCreate']
+        if result.get('userErrors') or not result.get('files'):
+            raise Exception(f"Shopify rejected the file: {result.get('userErrors')}")
+        
+        file_id = result['files'][0]['id']
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            node = self.graphql(FILE_IMAGE_QUERY, {'id': file_id}).get('node') or {}
+            if node.get('fileStatus') == 'FAILED':
+                raise Exception(f"Shopify could not process the image {url}")
+            if node.get('fileStatus') == 'READY' and node.get('image'):
+                return node['image']['url']
+            time.sleep(poll_interval)
+        return None
+
     # Page API Methods
 
     def get_pages(self, limit=50):
@@ -429,6 +695,48 @@ class ShopifyClient:
             f'products/{product_id}/images/{image_id}.json',
             data=image_data)
 
+    def update_product_image_alts(self, updates):
+        """
+        Update the alt text of many product images
+        
+        Up to PRODUCT_IMAGE_UPDATE_BATCH_SIZE images are updated per GraphQL
+        request instead of one REST request each. Falls back to the REST
+        endpoint when the store's API version rejects the mutation.
+        
+        Args:
+            updates (list): (product_id, image_id, alt_text) tuples
+            
+        Returns:
+            set: IDs (as strings) of the images that were updated
+        """
+        updated = set()
+        for start in range(0, len(updates), PRODUCT_IMAGE_UPDATE_BATCH_SIZE):
+            chunk = updates[start:start + PRODUCT_IMAGE_UPDATE_BATCH_SIZE]
+            variables = {}
+            for i, (product_id, image_id, alt_text) in enumerate(chunk):
+                variables[f'product{i}'] = f'gid://shopify/Product/{product_id}'
+                variables[f'image{i}'] = {'id': f'gid://shopify/ProductImage/{image_id}', 'altText': alt_text}
+            
+            try:
+                result = self.graphql(_product_image_update_mutation(len(chunk)), variables)
+            except ShopifyGraphQLError as e:
+                logger.warning(f"GraphQL image update failed, falling back to REST: {str(e)}")
+                for product_id, image_id, alt_text in chunk:
+                    try:
+                        if self.update_product_image(product_id, image_id, alt_text=alt_text):
+                            updated.add(str(image_id))
+                    except requests.exceptions.RequestException as error:
+                        logger.error(f"Error updating image {image_id}: {str(error)}")
+                continue
+            
+            for i, (_, image_id, _) in enumerate(chunk):
+                field = result.get(f'update{i}') or {}
+                if field.get('userErrors') or not field.get('image'):
+                    logger.error(f"Shopify rejected the update of image {image_id}: {field.get('userErrors')}")
+                else:
+                    updated.add(str(image_id))
+        return updated
+
     def upload_product_image(self,
                              product_id,
                              image_url=None,
@@ -0,0 +1,605 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from operator import attrgetter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+import requests
+from flask import current_app
+from sqlalchemy import update
+from models import db, BlogPost, PageContent, ShopifySettings, AISettings
+from shopify_client import get_shopify_client, ShopifyRateLimited
+from ai_service import get_ai_service
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Number of background jobs that can run at the same time in each worker process
+BACKGROUND_WORKERS = 4
+
+# Retry policy for Shopify calls that fail with a network error, a server
+# error or rate limiting; other client errors are not retried
+MAX_RETRIES = 5
+RETRY_DELAY = 30  # seconds
+
+# Longest one Shopify call can take with all its retries, allowing 30 seconds
+# per attempt
+SHOPIFY_CALL_TIMEOUT = (MAX_RETRIES + 1) * (RETRY_DELAY + 30)
+
+# Retried Shopify calls a publish makes one after another: the blog lookup,
+# creating a blog when the shop has none, and saving the article
+PUBLISH_SHOPIFY_CALLS = 3
+
+# Seconds a record can stay marked as being worked on by a background task
+# without any update before it is treated as abandoned, e.g. because the
+# worker running the task restarted. Tasks don't update the record while
+# they run, so this is twice the longest a publish can take with all its
+# retries, leaving room for the session adapter's own retries and rate limit
+# waits; it is also well above how long a generation takes
+STALE_TASK_TIMEOUT = 2 * PUBLISH_SHOPIFY_CALLS * SHOPIFY_CALL_TIMEOUT
+
+# Seconds a shop's blog list is reused before asking Shopify again
+BLOGS_CACHE_TTL = 900
+
+# Seconds to wait for the blog lookup when publishing a post; it covers retries
+BLOG_LOOKUP_TIMEOUT = SHOPIFY_CALL_TIMEOUT
+
+# Seconds to wait for a featured image to be copied to Shopify Files before
+# publishing with the original URL instead
+IMAGE_UPLOAD_TIMEOUT = 10
+
+# Host of images already stored on Shopify's CDN
+SHOPIFY_CDN_HOST = 'cdn.shopify.com'
+
+# Blog titles preferred when picking the blog to publish articles to
+_BLOG_TITLE_RE = re.compile(r'blog|news|article', re.IGNORECASE)
+
+# Seconds the hash of a record's last published payload is remembered
+PUBLISHED_HASH_TTL = 86400
+
+# Record attributes published as Shopify SEO metafields: (attribute, metafield key)
+_SEO_METAFIELDS = (('meta_title', 'title_tag'), ('meta_description', 'description_tag'))
+_SEO_VALUES = attrgetter(*(attr for attr, _ in _SEO_METAFIELDS))
+
+# Blog post attributes that make up an article payload, read in one call
+_ARTICLE_FIELDS = attrgetter('title', 'author', 'content', 'publish_date', 'summary', 'tags',
+                             'url_handle', 'featured_image_url')
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background-task')
+_blogs_cache = TTLCache(BLOGS_CACHE_TTL)
+_published_hashes = TTLCache(PUBLISHED_HASH_TTL)
+
+# Separate pool for lookups started by running tasks, so a task never waits
+# on work queued behind other tasks in _executor
+_lookup_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='shopify-lookup')
+
+
+def submit(task, *args):
+    """
+    Run a task in the background thread pool inside the application context
+
+    Args:
+        task (callable): Function to run
+        *args: Arguments passed to the task
+
+    Returns:
+        concurrent.futures.Future: Future for the running task
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                task(*args)
+            except Exception as e:
+                logger.exception(f"Background task {task.__name__} failed: {str(e)}",
+                                 extra={'task': task.__name__, 'task_args': args})
+            finally:
+                db.session.remove()
+
+    return _executor.submit(run)
+
+
+def is_stale(updated_at):
+    """
+    Check whether a record held by a background task has gone without updates too long
+
+    Args:
+        updated_at (datetime): The record's last update time (naive UTC)
+
+    Returns:
+        bool: True if the task working on the record should be considered abandoned
+    """
+    return updated_at is None or datetime.utcnow() - updated_at > timedelta(seconds=STALE_TASK_TIMEOUT)
+
+
+def _is_retryable(error):
+    """
+    Check whether a failed Shopify request may succeed if it is sent again
+
+    Rate limiting, connection errors, timeouts and 5xx responses are
+    transient. Other 4xx responses such as a bad token or an invalid payload
+    fail the same way every time. Idempotent requests whose 5xx retries ran
+    out in the session adapter raise RetryError, which is not retried again.
+
+    Args:
+        error (requests.exceptions.RequestException): The request error
+
+    Returns:
+        bool: True if the request should be retried
+    """
+    if isinstance(error, (ShopifyRateLimited, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return False
+
+
+def call_with_retries(func, *args):
+    """
+    Call a Shopify client method, retrying network, server and rate limit errors
+
+    Args:
+        func (callable): Function to call
+        *args: Arguments passed to the function
+
+    Returns:
+        The function's return value
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return func(*args)
+        except requests.exceptions.RequestException as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            # Rate-limited requests wait as long as Shopify asks, other failures a fixed delay
+            delay = e.retry_after if isinstance(e, ShopifyRateLimited) else RETRY_DELAY
+            logger.warning(f"Shopify request failed ({str(e)}), retrying in {delay}s "
+                           f"({attempt + 1}/{MAX_RETRIES})")
+            time.sleep(delay)
+
+
+def _get_shopify_client(settings_id):
+    """Get the shared Shopify client for a stored settings row"""
+    from app import get_active_shopify_settings
+
+    # Publishing almost always uses the active settings, whose cached snapshot saves a query
+    shopify_settings = get_active_shopify_settings()
+    if not shopify_settings or shopify_settings.id != settings_id:
+        shopify_settings = db.session.get(ShopifySettings, settings_id)
+    if not shopify_settings:
+        raise ValueError(f"Shopify settings {settings_id} not found")
+    return get_shopify_client(
+        shopify_settings.api_key,
+        shopify_settings.password,
+        shopify_settings.store_url,
+        shopify_settings.api_version
+    )
+
+
+def get_shop_blogs(shopify_client):
+    """
+    Get the blog list of the client's shop, cached per shop and API version
+
+    Args:
+        shopify_client (ShopifyClient): Client for the shop
+
+    Returns:
+        dict: Response from the Shopify API
+    """
+    key = (shopify_client.store_url, shopify_client.api_version)
+    blogs_response = _blogs_cache.get(key)
+    if blogs_response is None:
+        blogs_response = call_with_retries(shopify_client.get_blogs)
+        _blogs_cache.set(key, blogs_response)
+    return blogs_response
+
+
+def invalidate_shop_blogs(shopify_client):
+    """Drop the cached blog list of the client's shop after its blogs change"""
+    _blogs_cache.delete((shopify_client.store_url, shopify_client.api_version))
+
+
+def _get_ai_service(ai_settings_id):
+    """Get the shared AI service for a stored AI settings row"""
+    ai_settings = db.session.get(AISettings, ai_settings_id)
+    if not ai_settings:
+        raise ValueError(f"AI settings {ai_settings_id} not found")
+    return get_ai_service(ai_settings.api_key, ai_settings.api_provider)
+
+
+def generate_blog_post_task(post_id, blog_params, generate_image, ai_settings_id):
+    """
+    Generate the content of a placeholder blog post with the AI service
+
+    Args:
+        post_id (int): ID of the BlogPost created with status 'generating'
+        blog_params (dict): Generation parameters collected from the form
+        generate_image (bool): Whether to generate a featured image
+        ai_settings_id (int): ID of the AISettings to generate with
+    """
+    from app import slugify, invalidate_blog_stats_cache
+
+    blog_post = db.session.get(BlogPost, post_id)
+    if not blog_post:
+        logger.error(f"Blog post {post_id} not found for generation")
+        return
+
+    try:
+        ai_service = _get_ai_service(ai_settings_id)
+
+        # Record the start time for performance tracking
+        start_time = time.perf_counter()
+
+        # Generate the blog post content
+        blog_data = ai_service.generate_blog_post(blog_params)
+
+        # Generate featured image if requested
+        if generate_image:
+            featured_image_url = ai_service.generate_blog_image(
+                blog_data.get('title', ''),
+                blog_data.get('summary', '')
+            )
+            if featured_image_url:
+                blog_data['featured_image_url'] = featured_image_url
+
+        generation_time = time.perf_counter() - start_time
+
+        # Fill in the placeholder post with the generated content
+        blog_post.title = blog_data.get('title', '')
+        blog_post.content = blog_data.get('content', '')
+        blog_post.summary = blog_data.get('summary', '')
+        blog_post.featured_image_url = blog_data.get('featured_image_url')
+        blog_post.meta_title = blog_data.get('meta_title', '')
+        blog_post.meta_description = blog_data.get('meta_description', '')
+        blog_post.meta_keywords = blog_data.get('meta_keywords', '')
+        blog_post.url_handle = blog_data.get('url_handle') or slugify(blog_data.get('title', ''), max_length=255, separator='-')
+        blog_post.tags = ','.join(blog_data.get('tags', [])) if isinstance(blog_data.get('tags'), list) else blog_data.get('tags', '')
+        blog_post.category = blog_data.get('category', '')
+        blog_post.generation_stats = {
+            'word_count': blog_data.get('word_count', blog_params.get('word_count')),
+            'estimated_reading_time': blog_data.get('estimated_reading_time', 5),
+            'has_featured_image': bool(blog_data.get('featured_image_url')),
+            'generation_time': generation_time
+        }
+        blog_post.generation_error = None
+        blog_post.status = 'draft'
+        db.session.commit()
+
+    except Exception as e:
+        logger.exception(f"Error generating blog post {post_id}: {str(e)}",
+                         extra={'post_id': post_id, 'ai_settings_id': ai_settings_id})
+        db.session.rollback()
+        blog_post.status = 'generation_failed'
+        blog_post.generation_error = str(e)
+        db.session.commit()
+
+    invalidate_blog_stats_cache()
+
+
+def generate_page_content_task(page_id, page_params, ai_settings_id):
+    """
+    Generate the content of a placeholder page with the AI service
+
+    Args:
+        page_id (int): ID of the PageContent created with status 'generating'
+        page_params (dict): Generation parameters collected from the form
+        ai_settings_id (int): ID of the AISettings to generate with
+    """
+    page_content = db.session.get(PageContent, page_id)
+    if not page_content:
+        logger.error(f"Page {page_id} not found for generation")
+        return
+
+    try:
+        ai_service = _get_ai_service(ai_settings_id)
+
+        # Record the start time for performance tracking
+        start_time = time.perf_counter()
+
+        # Generate page content
+        result = ai_service.generate_page_content(page_params)
+
+        # Fill in the placeholder page with the generated content
+        page_content.title = result.get('title', '')
+        page_content.content = result.get('content', '')
+        page_content.meta_title = result.get('meta_title', '')
+        page_content.meta_description = result.get('meta_description', '')
+        page_content.meta_keywords = result.get('meta_keywords', '')
+        page_content.image_url = result.get('image_url', '')
+        page_content.generation_time = time.perf_counter() - start_time
+        page_content.generation_error = None
+        page_content.status = 'ready'
+        db.session.commit()
+
+    except Exception as e:
+        logger.exception(f"Error generating page {page_id}: {str(e)}",
+                         extra={'page_id': page_id, 'ai_settings_id': ai_settings_id})
+        db.session.rollback()
+        page_content.status = 'generation_failed'
+        page_content.generation_error = str(e)
+        db.session.commit()
+
+
+def build_seo_metafields(record):
+    """
+    Build the global SEO metafields for a blog post or page
+
+    Args:
+        record: BlogPost or PageContent with meta_title/meta_description
+
+    Returns:
+        list: Metafields for the attributes that have a value
+    """
+    return [{'namespace': 'global', 'key': key, 'value': value, 'type': 'single_line_text_field'}
+            for (_, key), value in zip(_SEO_METAFIELDS, _SEO_VALUES(record)) if value]
+
+
+def build_article_data(blog_post, published_at=None, image_url=None):
+    """
+    Build the Shopify article payload for a blog post
+
+    Args:
+        blog_post (BlogPost): The post to publish
+        published_at (str, optional): Publish time used when the post has none yet
+        image_url (str, optional): Featured image URL to use instead of the post's own
+
+    Returns:
+        dict: Article data in Shopify REST API format
+    """
+    title, author, content, publish_date, summary, tags, handle, featured_image_url = _ARTICLE_FIELDS(blog_post)
+    image_url = image_url or featured_image_url
+    article = {
+        'title': title,
+        'author': author or 'Store Admin',
+        'body_html': content,
+        'published': True,
+        'published_at': publish_date.isoformat() if publish_date else published_at,
+        'summary_html': summary or '',
+        'tags': tags or '',
+        'handle': handle or None,
+        # Add metafields for SEO if available
+        'metafields': build_seo_metafields(blog_post),
+        # Add featured image if available
+        **({'image': {'src': image_url}} if image_url else {})
+    }
+    return {'article': article}
+
+
+def build_page_data(page_content):
+    """
+    Build the Shopify page payload for a page
+
+    Args:
+        page_content (PageContent): The page to publish
+
+    Returns:
+        dict: Page data in Shopify REST API format
+    """
+    return {
+        'title': page_content.title,
+        'body_html': page_content.content,
+        'published': True,
+        'metafields': build_seo_metafields(page_content)
+    }
+
+
+def _payload_hash(payload):
+    """Hash a publish payload, ignoring its publish timestamp"""
+    content = {key: value for key, value in payload.items() if key != 'published_at'}
+    encoded = json.dumps(content, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def is_unchanged_since_publish(kind, record_id, payload):
+    """
+    Check whether a payload matches the last one successfully published for a record
+
+    Args:
+        kind (str): Record type, 'blog' or 'page'
+        record_id (int): ID of the record
+        payload (dict): The payload that would be published
+
+    Returns:
+        bool: True if publishing again would send the same content
+    """
+    return _published_hashes.get((kind, record_id)) == _payload_hash(payload)
+
+
+def _remember_published(kind, record_id, payload):
+    """Remember the hash of a payload that was published successfully"""
+    _published_hashes.set((kind, record_id), _payload_hash(payload))
+
+
+def upload_featured_image(shopify_client, image_url, alt=None):
+    """
+    Copy an external image to Shopify Files
+
+    Args:
+        shopify_client (ShopifyClient): Client for the shop
+        image_url (str): External URL of the image
+        alt (str, optional): Alt text for the image
+
+    Returns:
+        str: The Shopify CDN URL, or the original URL if the upload fails or times out
+    """
+    if urlparse(image_url).netloc == SHOPIFY_CDN_HOST:
+        return image_url
+    try:
+        return shopify_client.files_create_from_url(image_url, alt=alt,
+                                                    timeout=IMAGE_UPLOAD_TIMEOUT) or image_url
+    except Exception as e:
+        logger.warning(f"Could not upload image {image_url} to Shopify Files: {str(e)}")
+        return image_url
+
+
+def resolve_blog_id(shopify_client, blog_id=None):
+    """
+    Get the ID of the blog to publish to, creating a blog if the shop has none
+
+    Args:
+        shopify_client (ShopifyClient): Client for the shop
+        blog_id (str, optional): Blog ID already stored on the post
+
+    Returns:
+        str: ID of the blog
+    """
+    if blog_id:
+        return blog_id
+
+    # Get available blogs from the shop
+    blogs_response = get_shop_blogs(shopify_client)
+
+    if blogs_response and 'blogs' in blogs_response and blogs_response['blogs']:
+        # Prefer a blog with a name that contains 'blog', 'news', or 'article',
+        # otherwise use the first blog
+        blogs = blogs_response['blogs']
+        blog_id = next((blog['id'] for blog in blogs if _BLOG_TITLE_RE.search(blog.get('title') or '')),
+                       blogs[0]['id'])
+
+    # If no blogs found, create one
+    if not blog_id:
+        new_blog_data = {
+            'blog': {
+                'title': 'Store Blog',
+                'commentable': 'moderate'
+            }
+        }
+        blog_response = call_with_retries(shopify_client.create_blog, new_blog_data)
+        if blog_response and 'blog' in blog_response:
+            blog_id = blog_response['blog']['id']
+            # The shop had no blogs, so the new one is now its whole blog list
+            _blogs_cache.set((shopify_client.store_url, shopify_client.api_version),
+                             {'blogs': [blog_response['blog']]})
+        else:
+            invalidate_shop_blogs(shopify_client)
+            raise Exception("Failed to create a blog in Shopify")
+
+    return blog_id
+
+
+def publish_blog_post_task(post_id, settings_id):
+    """
+    Publish a blog post to Shopify and record the outcome on the post
+
+    Args:
+        post_id (int): ID of the BlogPost to publish
+        settings_id (int): ID of the ShopifySettings to publish with
+    """
+    from app import invalidate_blog_stats_cache
+
+    blog_post = db.session.get(BlogPost, post_id)
+    if not blog_post:
+        logger.error(f"Blog post {post_id} not found for publishing")
+        return
+
+    shopify_client = None
+    try:
+        # Read the clock once; the database stores naive UTC datetimes
+        now = datetime.now(timezone.utc)
+        shopify_client = _get_shopify_client(settings_id)
+
+        # Look up or create the blog in Shopify while the article payload is built
+        blog_future = _lookup_executor.submit(resolve_blog_id, shopify_client, blog_post.shopify_blog_id)
+
+        # Copy the featured image to Shopify's CDN at the same time
+        image_future = None
+        if blog_post.featured_image_url:
+            image_future = _lookup_executor.submit(upload_featured_image, shopify_client,
+                                                   blog_post.featured_image_url, blog_post.title)
+
+        # Use the copy of the featured image on Shopify's CDN when available
+        image_url = None
+        if image_future:
+            try:
+                image_url = image_future.result(timeout=IMAGE_UPLOAD_TIMEOUT * 2)
+            except Exception:
+                # Fall back to the post's original image URL
+                pass
+
+        # Prepare the article data
+        article_data = build_article_data(blog_post, now.isoformat(), image_url)
+
+        blog_id = blog_future.result(timeout=BLOG_LOOKUP_TIMEOUT)
+
+        # Create or update the article, its SEO metafields and image in one request
+        response = call_with_retries(shopify_client.save_article,
+                                     blog_id, article_data, blog_post.shopify_post_id)
+
+        if not response or 'article' not in response:
+            raise Exception("Failed to publish article to Shopify")
+
+        _remember_published('blog', post_id, article_data['article'])
+
+        # Update local data with Shopify IDs in a single UPDATE statement; the
+        # featured image now points at the copy on Shopify's CDN
+        db.session.execute(update(BlogPost).where(BlogPost.id == post_id).values(
+            shopify_blog_id=str(blog_id),
+            shopify_post_id=str(response['article']['id']),
+            status='published',
+            publish_error=None,
+            publish_date=now.replace(tzinfo=None),
+            settings_id=settings_id,
+            featured_image_url=article_data['article'].get('image', {}).get('src')
+        ))
+        db.session.commit()
+
+    except Exception as e:
+        logger.exception(f"Error publishing blog post {post_id} to Shopify: {str(e)}",
+                         extra={'post_id': post_id, 'settings_id': settings_id,
+                                'shopify_store': shopify_client.store_url if shopify_client else None})
+        db.session.rollback()
+        blog_post.status = 'publish_failed'
+        blog_post.publish_error = str(e)
+        db.session.commit()
+
+    invalidate_blog_stats_cache()
+
+
+def publish_page_task(page_id, settings_id):
+    """
+    Publish a page to Shopify and record the outcome on the page
+
+    Args:
+        page_id (int): ID of the PageContent to publish
+        settings_id (int): ID of the ShopifySettings to publish with
+    """
+    page_content = db.session.get(PageContent, page_id)
+    if not page_content:
+        logger.error(f"Page {page_id} not found for publishing")
+        return
+
+    shopify_client = None
+    try:
+        # Read the clock once; the database stores naive UTC datetimes
+        now = datetime.now(timezone.utc)
+        shopify_client = _get_shopify_client(settings_id)
+
+        # Create page data for Shopify
+        page_data = build_page_data(page_content)
+
+        # Publish to Shopify
+        result = call_with_retries(shopify_client.create_page, page_data)
+        _remember_published('page', page_id, page_data)
+
+        # Update the page record with Shopify page ID and published status in a single UPDATE
+        db.session.execute(update(PageContent).where(PageContent.id == page_id).values(
+            shopify_page_id=result.get('id'),
+            published=True,
+            status='published',
+            publish_error=None,
+            publish_date=now.replace(tzinfo=None)
+        ))
+        db.session.commit()
+
+    except Exception as e:
+        logger.exception(f"Error publishing page {page_id} to Shopify: {str(e)}",
+                         extra={'page_id': page_id, 'settings_id': settings_id,
+                                'shopify_store': shopify_client.store_url if shopify_client else None})
+        db.session.rollback()
+        page_content.status = 'publish_failed'
+        page_content.publish_error = str(e)
+        db.session.commit()
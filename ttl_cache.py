@@ -0,0 +1,59 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Small thread-safe in-process cache whose entries expire after a fixed time"""
+
+    def __init__(self, ttl):
+        """
+        Initialize the cache
+
+        Args:
+            ttl (float): Number of seconds an entry stays valid after being set
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            The cached value, or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value in the cache
+
+        Args:
+            key: Cache key
+            value: Value to cache (may be None)
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key):
+        """Remove a single entry from the cache if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._entries.clear()